@@ -0,0 +1,68 @@
+"""Thông lượng xuất dữ liệu: bản cũ (cả bảng -> to_csv/to_json trong RAM) vs xuất theo luồng từ cursor SQL.
+
+Chạy:  python benchmarks/bench_export.py [--rows 200000] [--formats csv json txt parquet arrow]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from member_db import ConnectionPool, CUSTOMER_COLUMNS, INSERT_CUSTOMER_SQL, migrate
+from member_export import available_formats, export_to_file, iter_customer_chunks
+
+def make_db(path, n, seed=42):
+    rng = np.random.default_rng(seed)
+    dates = (np.datetime64("2023-01-01") + rng.integers(0, 3 * 365, n).astype("timedelta64[D]")).astype(str)
+    durations = rng.choice([1, 2, 3, 6, 12], n).tolist()
+    rows = [(1, f"Khách {i}", f"PC-{i % 97}", d, dur) for i, (d, dur) in enumerate(zip(dates.tolist(), durations))]
+    pool = ConnectionPool(path, max_size=1)
+    with pool.connection() as conn:
+        migrate(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(INSERT_CUSTOMER_SQL, rows)
+    return pool
+
+def measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter(); result = fn(); elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]; tracemalloc.stop()
+    return result, elapsed, peak
+
+def legacy_export(pool, fmt):
+    """Bản gốc: đọc cả bảng rồi dựng cả chuỗi bytes"""
+    with pool.connection() as conn:
+        df = pd.read_sql_query(f"SELECT {CUSTOMER_COLUMNS} FROM customers WHERE owner_id=?", conn, params=(1,))
+    if fmt == "json": return len(df.to_json(orient="records", force_ascii=False).encode("utf-8"))
+    return len(df.to_csv(index=False, sep="," if fmt == "csv" else "\t").encode("utf-8"))
+
+def streaming_export(pool, fmt, compress):
+    with pool.connection() as conn:
+        path, rows, size = export_to_file(iter_customer_chunks(conn, 1), fmt, compress)
+    os.remove(path)
+    return size
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--formats", nargs="+", default=available_formats())
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = make_db(os.path.join(tmp, "bench.db"), args.rows)
+        print(f"{args.rows:,} dòng")
+        print(f"{'format':<14} {'time (s)':>9} {'rows/s':>12} {'size (MB)':>10} {'peak RAM (MB)':>14}")
+        for fmt in args.formats:
+            cases = [(f"{fmt}", lambda: streaming_export(pool, fmt, False)),
+                     (f"{fmt}.gz", lambda: streaming_export(pool, fmt, True))]
+            if fmt in ("csv", "json", "txt"): cases.insert(0, (f"{fmt} (legacy)", lambda: legacy_export(pool, fmt)))
+            for label, fn in cases:
+                size, elapsed, peak = measure(fn)
+                print(f"{label:<14} {elapsed:>9.3f} {args.rows / elapsed:>12,.0f} {size / 1048576:>10.1f} {peak / 1048576:>14.1f}")
+        pool.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""RAM & tốc độ dữ liệu chế độ khách: bản cũ (DataFrame object + pd.concat mỗi lần thêm, lọc ra bản sao khi xóa)
+vs GuestStore dạng cột. In RAM mỗi phiên để ước lượng cỡ máy chủ (số phiên khách đồng thời x RAM/phiên).
+
+Chạy:  python benchmarks/bench_guest_store.py [--rows 1000 10000 100000] [--adds 200] [--deletes 200]
+"""
+import argparse
+import os
+import sys
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from synthetic_data import make_customers, parse_size
+from member_store import GuestStore
+
+COLS = ["name", "device_info", "reg_date", "duration"]
+
+def legacy_session(df, adds, deletes):
+    """Như membermanagement.py trước đây: guest_data là 1 DataFrame, mỗi thao tác tạo bản mới"""
+    data = df.copy(); data.insert(0, "id", range(1, len(df) + 1))
+    t0 = time.perf_counter()
+    for i in range(adds):
+        row = {"id": int(time.time()) + i, **df.iloc[i % len(df)].to_dict()}
+        data = pd.concat([data, pd.DataFrame([row])], ignore_index=True)
+    t_add = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for cid in data["id"].iloc[:deletes].tolist():
+        data = data[data["id"] != cid].reset_index(drop=True)
+    t_del = time.perf_counter() - t0
+    return data, t_add, t_del, int(data.memory_usage(index=True, deep=True).sum())
+
+def store_session(df, adds, deletes):
+    store = GuestStore()
+    store.append(df, base_id=1)
+    t0 = time.perf_counter()
+    for i in range(adds): store.append(df.iloc[[i % len(df)]])
+    t_add = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for cid in store.frame()["id"].iloc[:deletes].tolist(): store.delete([cid])
+    t_del = time.perf_counter() - t0
+    frame = store.frame()   # như 1 lượt rerun: frame được dựng và cache trong kho
+    return frame, t_add, t_del, store.nbytes()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=parse_size, nargs="+", default=[1_000, 10_000, 100_000])
+    ap.add_argument("--adds", type=int, default=200)
+    ap.add_argument("--deletes", type=int, default=200)
+    args = ap.parse_args()
+    print(f"{'rows':>9} {'bản':<8} {'thêm (ms/lần)':>14} {'xóa (ms/lần)':>13} {'RAM/phiên (MB)':>15}")
+    for n in args.rows:
+        df = make_customers(n)[COLS]
+        for label, fn in (("cũ", legacy_session), ("cột", store_session)):
+            data, t_add, t_del, nbytes = fn(df, args.adds, args.deletes)
+            print(f"{n:>9,} {label:<8} {t_add / args.adds * 1000:>14.2f} {t_del / args.deletes * 1000:>13.2f} {nbytes / 1048576:>15.2f}")
+
+if __name__ == "__main__":
+    main()
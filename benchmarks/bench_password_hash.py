@@ -0,0 +1,56 @@
+"""Chi phí băm mật khẩu: số lần đăng nhập/giây/lõi ở từng mức chi phí (PBKDF2 / scrypt / SHA-256 cũ).
+
+Chạy:  python benchmarks/bench_password_hash.py [--seconds 2] [--threads 4]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from member_auth import PasswordHasher, legacy_sha256
+
+SETTINGS = [
+    ("sha256 (cũ)", None),
+    ("pbkdf2 100k", PasswordHasher("pbkdf2_sha256", iterations=100_000)),
+    ("pbkdf2 300k", PasswordHasher("pbkdf2_sha256", iterations=300_000)),
+    ("pbkdf2 600k", PasswordHasher("pbkdf2_sha256", iterations=600_000)),
+    ("scrypt n=2^14", PasswordHasher("scrypt", n=2 ** 14)),
+    ("scrypt n=2^15", PasswordHasher("scrypt", n=2 ** 15)),
+]
+
+def logins_per_sec(verify, seconds, threads):
+    """Số lần verify hoàn tất/giây khi chạy song song trên `threads` luồng (hashlib nhả GIL)"""
+    deadline = time.perf_counter() + seconds
+    def worker():
+        n = 0
+        while time.perf_counter() < deadline: verify(); n += 1
+        return n
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        total = sum(f.result() for f in [ex.submit(worker) for _ in range(threads)])
+    return total / (time.perf_counter() - start)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seconds", type=float, default=2.0)
+    ap.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    args = ap.parse_args()
+    cores = os.cpu_count() or 1
+    print(f"{cores} lõi, {args.threads} luồng song song")
+    print(f"{'setting':<15} {'1 verify (ms)':>14} {'logins/s (1 luồng)':>19} {'logins/s (N luồng)':>19} {'logins/s/lõi':>13}")
+    for label, hasher in SETTINGS:
+        if hasher is None:
+            stored = legacy_sha256("mật khẩu mẫu")
+            verify = lambda: legacy_sha256("mật khẩu mẫu") == stored
+        else:
+            stored = hasher.hash("mật khẩu mẫu")
+            verify = lambda h=hasher, s=stored: h.verify("mật khẩu mẫu", s)
+        t0 = time.perf_counter(); verify(); one = (time.perf_counter() - t0) * 1000
+        single = logins_per_sec(verify, args.seconds, 1)
+        multi = logins_per_sec(verify, args.seconds, args.threads)
+        print(f"{label:<15} {one:>14.2f} {single:>19,.1f} {multi:>19,.1f} {multi / min(args.threads, cores):>13,.1f}")
+
+if __name__ == "__main__":
+    main()
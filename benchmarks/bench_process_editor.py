@@ -0,0 +1,71 @@
+"""So sánh process_data_for_editor: bản cũ theo dòng (.apply) vs bản vector hóa.
+
+Chạy:  python benchmarks/bench_process_editor.py [--sizes 1000 100000 1000000] [--legacy-max 100000]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from member_dates import parse_date, calculate_expiry, process_data_for_editor
+
+def legacy_process_data_for_editor(df, today):
+    """Bản gốc (trước khi vector hóa), giữ nguyên để đối chiếu kết quả & tốc độ"""
+    if df.empty: return df
+    df['reg_date_obj'] = df['reg_date'].apply(lambda x: parse_date(x))
+    df['duration'] = pd.to_numeric(df['duration'], errors='coerce').fillna(1).astype(int)
+    def get_status_expiry(row):
+        exp = calculate_expiry(row['reg_date_obj'], row['duration'])
+        if not exp: return "Lỗi", "⚪ Lỗi"
+        days = (exp - today).days
+        exp_str = exp.strftime("%d/%m/%Y")
+        if days < 0: return exp_str, f"🔴 ĐÃ HẾT ({abs(days)}d)"
+        if days <= 3: return exp_str, f"🟡 Sắp hết ({days}d)"
+        return exp_str, f"🟢 Còn {days} ngày"
+    df[['Hết Hạn', 'Trạng Thái']] = df.apply(lambda x: pd.Series(get_status_expiry(x)), axis=1)
+    return df.rename(columns={"name": "Tên Khách Hàng", "device_info": "Thông tin khách hàng", "reg_date_obj": "Ngày ĐK", "duration": "Gói (tháng)"})
+
+def make_frame(n, seed=42):
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("2023-01-01")
+    days = rng.integers(0, 3 * 365, n)
+    dates = pd.Series(start + days.astype("timedelta64[D]"))
+    fmt = rng.choice(["%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y"], n, p=[0.8, 0.15, 0.05])
+    reg = dates.dt.strftime("%d/%m/%Y").to_numpy(dtype=object)
+    for f in ("%Y-%m-%d", "%d-%m-%Y"):
+        mask = fmt == f
+        reg[mask] = dates[mask].dt.strftime(f).to_numpy()
+    reg[rng.random(n) < 0.01] = "không rõ"
+    return pd.DataFrame({
+        "id": np.arange(1, n + 1), "owner_id": 1,
+        "name": [f"Khách {i}" for i in range(n)], "device_info": "PC",
+        "reg_date": reg, "duration": rng.choice([1, 2, 3, 6, 12], n),
+    })
+
+def same_output(a, b):
+    a = a.copy(); b = b.copy()
+    a["Ngày ĐK"] = pd.to_datetime(a["Ngày ĐK"]); b["Ngày ĐK"] = pd.to_datetime(b["Ngày ĐK"])
+    return a.reset_index(drop=True).equals(b.reset_index(drop=True)) or a.astype(str).equals(b.astype(str))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    ap.add_argument("--legacy-max", type=int, default=100_000, help="Bỏ qua bản cũ với bảng lớn hơn (quá chậm)")
+    args = ap.parse_args()
+    today = datetime.now()
+    print(f"{'rows':>10} {'legacy (s)':>12} {'vector (s)':>12} {'speedup':>9}  same")
+    for n in args.sizes:
+        df = make_frame(n)
+        t0 = time.perf_counter(); new = process_data_for_editor(df.copy(), today); t_new = time.perf_counter() - t0
+        if n <= args.legacy_max:
+            t0 = time.perf_counter(); old = legacy_process_data_for_editor(df.copy(), today); t_old = time.perf_counter() - t0
+            print(f"{n:>10,} {t_old:>12.3f} {t_new:>12.3f} {t_old / t_new:>8.1f}x  {same_output(old, new)}")
+        else:
+            print(f"{n:>10,} {'-':>12} {t_new:>12.3f} {'-':>9}  -")
+
+if __name__ == "__main__":
+    main()
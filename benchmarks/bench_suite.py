@@ -0,0 +1,226 @@
+"""Bộ benchmark tổng hợp, chạy không cần trình duyệt: dữ liệu giả lập (synthetic_data.py) ở nhiều cỡ,
+đo các hàm lõi mà giao diện gọi mỗi lượt rerun, kết quả ra JSON để so sánh/chặn hồi quy.
+
+Chạy:  python benchmarks/bench_suite.py [--sizes 1k 100k 1m 10m] [--repeat 3] [--engine sqlite]
+                                        [--cases ...] [--out ketqua.json] [--baseline cu.json --max-regression 0.25]
+--baseline: so median từng (engine, case, size) với lần chạy cũ; chậm hơn quá ngưỡng => in ra và thoát mã 1.
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from synthetic_data import make_customers, make_db, parse_size
+from member_db import (ConnectionPool, CUSTOMER_COLUMNS, bulk_insert_frames, count_customers, migrate, monthly_revenue,
+                       query_customers, search_frame, status_counts)
+from member_dates import process_data_for_editor, revenue_by_month
+from member_export import available_formats, export_to_file, iter_customer_chunks
+from member_import import iter_import_frames
+
+OWNER = 1
+SEARCH = "nguyen van"
+PAGE_SIZE = 50
+# Nơi lưu CSDL: tệp tạm trên đĩa, hoặc :memory: (1 kết nối) để tách chi phí I/O
+ENGINES = {"sqlite": "file", "sqlite-memory": ":memory:"}
+
+
+class Bench:
+    """Dữ liệu + CSDL dựng sẵn cho 1 cỡ; mỗi case là 1 hàm trả về số dòng đã xử lý"""
+
+    def __init__(self, n, engine, owners, seed, tmpdir, import_max):
+        self.n, self.engine, self.tmpdir = n, engine, tmpdir
+        self.df = make_customers(n, owners, seed)
+        path = os.path.join(tmpdir, f"bench_{n}.db") if ENGINES[engine] == "file" else ":memory:"
+        t0 = time.perf_counter()
+        self.pool = make_db(path, self.df, max_size=2 if ENGINES[engine] == "file" else 1)
+        self.load_seconds = time.perf_counter() - t0
+        with self.pool.connection() as conn:
+            self.owner_df = pd.read_sql_query(f"SELECT {CUSTOMER_COLUMNS} FROM customers WHERE owner_id=?", conn, params=(OWNER,))
+        part = self.df[self.df['owner_id'] == OWNER].head(import_max)[["name", "device_info", "reg_date", "duration"]]
+        self.csv_text = part.to_csv(index=False)
+        self.json_text = part.to_json(orient="records", force_ascii=False)
+        self.import_rows = len(part)
+        self._imports = 0
+
+    def close(self):
+        self.pool.close()
+
+    # --- các case ---
+    def get_all_customers(self):
+        # Cùng câu SQL với get_all_customers() của membermanagement.py (khi cache trượt)
+        with self.pool.connection() as conn:
+            return len(pd.read_sql_query(f"SELECT {CUSTOMER_COLUMNS} FROM customers WHERE owner_id=?", conn, params=(OWNER,)))
+
+    def process_all(self):
+        return len(process_data_for_editor(self.owner_df))
+
+    def editor_page(self):
+        # 1 trang tab 1: đếm + LIMIT/OFFSET giữa bảng + process_data_for_editor
+        with self.pool.connection() as conn:
+            total = count_customers(conn, OWNER)
+            df = query_customers(conn, OWNER, limit=PAGE_SIZE, offset=total // 2)
+        return len(process_data_for_editor(df))
+
+    def status_counts(self):
+        with self.pool.connection() as conn: return sum(status_counts(conn, OWNER).values())
+
+    def search_sql(self):
+        with self.pool.connection() as conn:
+            count_customers(conn, OWNER, search=SEARCH)
+            return len(query_customers(conn, OWNER, search=SEARCH, limit=PAGE_SIZE))
+
+    def search_frame(self):
+        return len(search_frame(self.owner_df, SEARCH))
+
+    def revenue_rollup(self):
+        with self.pool.connection() as conn: return len(monthly_revenue(conn, OWNER))
+
+    def revenue_frame(self):
+        return len(revenue_by_month(self.owner_df))
+
+    def parse_csv(self):
+        return sum(len(f) for f in iter_import_frames(io.StringIO(self.csv_text)))
+
+    def parse_json(self):
+        return sum(len(f) for f in iter_import_frames(io.StringIO(self.json_text)))
+
+    def _import(self, text):
+        # Mỗi lần đo ghi vào 1 CSDL mới (ghi vào CSDL lớn dần sẽ làm các lần đo không còn như nhau)
+        self._imports += 1
+        path = os.path.join(self.tmpdir, f"import_{self.n}_{self._imports}.db")
+        pool = ConnectionPool(path, max_size=1)
+        with pool.connection() as conn: migrate(conn)
+        try: return bulk_insert_frames(pool, OWNER, iter_import_frames(io.StringIO(text)))["rows"]
+        finally:
+            pool.close()
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix): os.remove(path + suffix)
+
+    def import_csv(self):
+        return self._import(self.csv_text)
+
+    def import_json(self):
+        return self._import(self.json_text)
+
+    def export(self, fmt):
+        with self.pool.connection() as conn:
+            path, rows, size = export_to_file(iter_customer_chunks(conn, OWNER), fmt)
+        os.remove(path)
+        return rows
+
+    def cases(self):
+        out = {
+            "get_all_customers": self.get_all_customers,
+            "process_data_for_editor": self.process_all,
+            "editor_page": self.editor_page,
+            "status_counts": self.status_counts,
+            "search_sql": self.search_sql,
+            "search_frame": self.search_frame,
+            "revenue_rollup": self.revenue_rollup,
+            "revenue_frame": self.revenue_frame,
+            "parse_csv": self.parse_csv,
+            "parse_json": self.parse_json,
+            "import_csv": self.import_csv,
+            "import_json": self.import_json,
+        }
+        for fmt in available_formats(): out[f"export_{fmt}"] = lambda fmt=fmt: self.export(fmt)
+        return out
+
+
+def run_case(fn, repeat, memory):
+    times, rows = [], 0
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter(); rows = fn(); times.append(time.perf_counter() - t0)
+    result = {"rows": rows, "repeat": repeat, "median_s": statistics.median(times), "min_s": min(times), "max_s": max(times)}
+    result["rows_per_s"] = rows / result["median_s"] if result["median_s"] > 0 else None
+    if memory:
+        # Lượt riêng dưới tracemalloc (chậm hơn nhiều) => không lẫn vào thời gian
+        gc.collect(); tracemalloc.start()
+        fn(); result["peak_mb"] = tracemalloc.get_traced_memory()[1] / 1048576
+        tracemalloc.stop()
+    return result
+
+def environment(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError): commit = None
+    try: import pyarrow; arrow = pyarrow.__version__
+    except ImportError: arrow = None
+    return {"ts": datetime.now().isoformat(timespec="seconds"), "commit": commit, "engine": args.engine,
+            "seed": args.seed, "owners": args.owners, "python": platform.python_version(), "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "pandas": pd.__version__, "numpy": np.__version__,
+            "sqlite": sqlite3.sqlite_version, "pyarrow": arrow}
+
+def regressions(results, baseline, max_regression):
+    """[(case, size, cũ, mới, tỷ lệ)] của các case chậm hơn ngưỡng so với baseline (cùng engine)"""
+    old = {(r["engine"], r["case"], r["size"]): r for r in baseline["results"]}
+    out = []
+    for r in results:
+        prev = old.get((r["engine"], r["case"], r["size"]))
+        if prev and prev["median_s"] > 0 and r["median_s"] / prev["median_s"] > 1 + max_regression:
+            out.append((r["case"], r["size"], prev["median_s"], r["median_s"], r["median_s"] / prev["median_s"]))
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark các hàm lõi trên dữ liệu giả lập, xuất JSON")
+    ap.add_argument("--sizes", type=parse_size, nargs="+", default=[parse_size("1k"), parse_size("100k")],
+                    help="Số dòng mỗi cỡ: 1k 100k 1m 10m")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--engine", choices=list(ENGINES), default="sqlite")
+    ap.add_argument("--owners", type=int, default=1, help="Số owner; các case đo trên owner 1")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--cases", nargs="+", help="Chỉ chạy các case này (mặc định: tất cả)")
+    ap.add_argument("--import-max", type=parse_size, default=parse_size("1m"),
+                    help="Giới hạn số dòng của case parse/import (văn bản nhập nằm trong RAM)")
+    ap.add_argument("--memory", action="store_true", help="Đo thêm RAM đỉnh (tracemalloc) mỗi case")
+    ap.add_argument("--out", help="Ghi JSON kết quả ra tệp (mặc định: stdout)")
+    ap.add_argument("--baseline", help="JSON của lần chạy trước để so sánh")
+    ap.add_argument("--max-regression", type=float, default=0.25, help="Chậm hơn baseline quá tỷ lệ này => lỗi")
+    args = ap.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for n in args.sizes:
+            bench = Bench(n, args.engine, args.owners, args.seed, tmpdir, args.import_max)
+            print(f"{n:,} dòng (nạp CSDL {bench.load_seconds:.2f}s)", file=sys.stderr)
+            results.append({"engine": args.engine, "case": "load_db", "size": n, "rows": n, "repeat": 1,
+                            "median_s": bench.load_seconds, "min_s": bench.load_seconds, "max_s": bench.load_seconds,
+                            "rows_per_s": n / bench.load_seconds})
+            for name, fn in bench.cases().items():
+                if args.cases and name not in args.cases: continue
+                res = {"engine": args.engine, "case": name, "size": n, **run_case(fn, args.repeat, args.memory)}
+                results.append(res)
+                print(f"  {name:<24} {res['median_s'] * 1000:>10.1f} ms {res['rows']:>12,} dòng"
+                      + (f" {res['peak_mb']:>8.1f} MB" if "peak_mb" in res else ""), file=sys.stderr)
+            bench.close()
+            del bench; gc.collect()
+
+    report = {"schema": 1, "meta": environment(args), "results": results}
+    text = json.dumps(report, ensure_ascii=False, indent=1)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f: f.write(text)
+    else: print(text)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f: slow = regressions(results, json.load(f), args.max_regression)
+        for case, size, old, new, ratio in slow:
+            print(f"CHẬM HƠN: {case} @ {size:,}: {old * 1000:.1f} -> {new * 1000:.1f} ms ({ratio:.2f}x)", file=sys.stderr)
+        if slow: sys.exit(1)
+
+if __name__ == "__main__":
+    main()
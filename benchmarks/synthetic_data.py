@@ -0,0 +1,122 @@
+"""Sinh dữ liệu khách giả lập cho benchmark: họ tên tiếng Việt có dấu, ngày ĐK trộn nhiều định dạng
+(~1% hỏng), gói 1-12 tháng, nhiều owner. Cùng seed => cùng dữ liệu (so sánh được giữa các lần chạy).
+
+Chạy:  python benchmarks/synthetic_data.py --rows 100k --out khach.csv   (.csv / .json / .jsonl / .db)
+"""
+import argparse
+import os
+import sys
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from member_db import ConnectionPool, INSERT_CUSTOMER_SQL, migrate
+from member_dates import iso_dates
+
+# Tỷ lệ họ gần với thống kê dân số
+SURNAMES = {"Nguyễn": 38, "Trần": 11, "Lê": 9.5, "Phạm": 7, "Hoàng": 5, "Huỳnh": 5, "Phan": 4.5, "Vũ": 3.9, "Võ": 3.9,
+            "Đặng": 2.1, "Bùi": 2, "Đỗ": 1.4, "Hồ": 1.3, "Ngô": 1.3, "Dương": 1, "Lý": 0.5, "Đinh": 0.5, "Trương": 0.5}
+MIDDLE = ["Văn", "Thị", "Hữu", "Đức", "Minh", "Ngọc", "Thanh", "Quốc", "Gia", "Xuân", "Thu", "Hoàng", "Anh", "Bảo", ""]
+GIVEN = ["An", "Anh", "Bình", "Châu", "Chi", "Cường", "Dũng", "Duy", "Đạt", "Giang", "Hà", "Hải", "Hạnh", "Hiếu",
+         "Hòa", "Hùng", "Huy", "Hương", "Khánh", "Khoa", "Lan", "Linh", "Long", "Mai", "Minh", "My", "Nam", "Nga",
+         "Ngân", "Nhung", "Phong", "Phúc", "Phương", "Quân", "Quang", "Quỳnh", "Sơn", "Tâm", "Thảo", "Thắng",
+         "Thủy", "Tiến", "Trang", "Trí", "Trung", "Tú", "Tuấn", "Tùng", "Uyên", "Vân", "Việt", "Vy", "Yến"]
+# Mẫu thông tin máy/liên hệ -> giới hạn số đi kèm
+DEVICES = {"PC-{:02d}": 100, "Máy {:02d}": 100, "Laptop #{}": 1000, "Zalo 09{:08d}": 10 ** 8, "Phòng VIP {}": 20, "Acc game {:05d}": 10 ** 5}
+# Định dạng ngày người dùng hay nhập (xem member_dates.DATE_FORMATS) và tỷ lệ
+DATE_MIX = {"%d/%m/%Y": 0.70, "%Y-%m-%d": 0.15, "%d-%m-%Y": 0.08, "%d/%m/%y": 0.05, "%m/%d/%Y": 0.02}
+BAD_DATES = ["", "không rõ", "31/02/2024", "??"]
+DURATIONS = {1: 0.45, 2: 0.15, 3: 0.2, 6: 0.1, 12: 0.1}
+SIZE_SUFFIX = {"k": 1_000, "m": 1_000_000}
+
+
+def parse_size(text):
+    """'100k' / '1m' / '10M' / '2500' -> số dòng"""
+    text = str(text).strip().lower().replace("_", "")
+    if text and text[-1] in SIZE_SUFFIX: return int(float(text[:-1]) * SIZE_SUFFIX[text[-1]])
+    return int(text)
+
+def _weights(d):
+    p = np.array(list(d.values()), dtype=float)
+    return list(d), p / p.sum()
+
+def name_pool():
+    """Mọi tổ hợp họ + đệm + tên (kèm trọng số theo họ); chọn theo chỉ số thay vì ghép chuỗi từng dòng"""
+    surnames, p = _weights(SURNAMES)
+    names, weights = [], []
+    for s, w in zip(surnames, p):
+        for m in MIDDLE:
+            for g in GIVEN:
+                names.append(" ".join(x for x in (s, m, g) if x)); weights.append(w)
+    weights = np.array(weights)
+    return np.array(names, dtype=object), weights / weights.sum()
+
+def device_pool(rng, size=5000):
+    templates = list(DEVICES.items())
+    kinds = rng.integers(0, len(templates), size)
+    nums = rng.integers(0, 10 ** 8, size)
+    out = [templates[k][0].format(n % templates[k][1]) for k, n in zip(kinds.tolist(), nums.tolist())]
+    return np.array(out + [""] * (size // 20), dtype=object)
+
+def make_customers(n, owners=1, seed=42, today=None, years=3, bad_rate=0.01):
+    """DataFrame id, owner_id, name, device_info, reg_date (chuỗi, nhiều định dạng), duration.
+    Ngày ĐK rải đều trong `years` năm tới hôm nay => đủ cả khách còn hạn, sắp hết và đã hết."""
+    rng = np.random.default_rng(seed)
+    today = today or date.today()
+    names, name_p = name_pool()
+    devices = device_pool(rng)
+    span = years * 365
+    # Bảng tra (định dạng x ngày) dựng 1 lần cho ~1000 ngày, rồi mỗi dòng chỉ lấy theo chỉ số
+    days = pd.Series(pd.to_datetime([today - timedelta(days=int(d)) for d in range(span)]))
+    fmts, fmt_p = _weights(DATE_MIX)
+    table = np.array([days.dt.strftime(f).to_numpy(dtype=object) for f in fmts], dtype=object)
+    reg = table[rng.choice(len(fmts), n, p=fmt_p), rng.integers(0, span, n)]
+    bad = rng.random(n) < bad_rate
+    reg[bad] = np.array(BAD_DATES, dtype=object)[rng.integers(0, len(BAD_DATES), int(bad.sum()))]
+    durs, dur_p = _weights(DURATIONS)
+    return pd.DataFrame({
+        "id": np.arange(1, n + 1),
+        "owner_id": rng.integers(1, owners + 1, n) if owners > 1 else np.ones(n, dtype=np.int64),
+        "name": names[rng.choice(len(names), n, p=name_p)],
+        "device_info": devices[rng.integers(0, len(devices), n)],
+        "reg_date": reg,
+        "duration": np.array(durs)[rng.choice(len(durs), n, p=dur_p)],
+    })
+
+def make_db(path, df, chunk_size=50_000, max_size=2):
+    """Ghi khách giả lập vào CSDL mới (schema đầy đủ: FTS, trigger doanh thu/hết hạn) trong 1 transaction.
+    path=":memory:" => cần max_size=1 (mỗi kết nối :memory: là 1 CSDL riêng)"""
+    pool = ConnectionPool(path, max_size=max_size)
+    with pool.connection() as conn:
+        migrate(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany("INSERT OR IGNORE INTO users (id, username, password) VALUES (?, ?, '')",
+                         [(int(o), f"owner{o}") for o in sorted(df['owner_id'].unique())])
+        for i in range(0, len(df), chunk_size):
+            part = df.iloc[i:i + chunk_size]
+            conn.executemany(INSERT_CUSTOMER_SQL, zip(part['owner_id'].tolist(), part['name'].tolist(),
+                                                      part['device_info'].tolist(), iso_dates(part['reg_date']).tolist(),
+                                                      part['duration'].tolist()))
+    return pool
+
+def write_file(df, path):
+    """Xuất theo đuôi tệp: .csv / .json (mảng) / .jsonl / .db"""
+    ext = os.path.splitext(path)[1].lower()
+    cols = ["name", "device_info", "reg_date", "duration"]
+    if ext == ".csv": df[cols].to_csv(path, index=False)
+    elif ext == ".json": df[cols].to_json(path, orient="records", force_ascii=False)
+    elif ext == ".jsonl": df[cols].to_json(path, orient="records", lines=True, force_ascii=False)
+    elif ext == ".db": make_db(path, df).close()
+    else: raise ValueError(f"Đuôi tệp không hỗ trợ: {ext}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Sinh dữ liệu khách giả lập")
+    ap.add_argument("--rows", type=parse_size, default=parse_size("100k"), help="Số dòng (1k, 100k, 1m, 10m...)")
+    ap.add_argument("--owners", type=int, default=1)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--out", required=True, help="Tệp đích: .csv / .json / .jsonl / .db")
+    args = ap.parse_args()
+    write_file(make_customers(args.rows, args.owners, args.seed), args.out)
+    print(f"{args.rows:,} dòng -> {args.out}")
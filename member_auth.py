@@ -0,0 +1,203 @@
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# --- PHIÊN ĐĂNG NHẬP KÝ HMAC ---
+# Cookie chứa token "v1.<user_id>.<username base64>.<hết hạn>.<chữ ký>" thay cho username trần.
+# Kiểm tra token hoàn toàn trong RAM (HMAC + cache LRU/TTL) => phiên mới đến kèm cookie không cần đọc SQLite.
+# Khóa ký sinh ngẫu nhiên 1 lần, lưu trong bảng app_settings (xem migration 6 của member_db).
+
+SESSION_TTL = 30 * 24 * 3600
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class SessionSigner:
+    """Tạo/kiểm tra token phiên; cache kết quả kiểm tra theo token (LRU, TTL)"""
+
+    def __init__(self, secret, ttl=SESSION_TTL, cache_size=4096, cache_ttl=600.0):
+        self._key = secret.encode() if isinstance(secret, str) else secret
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._cache = OrderedDict()   # token -> (hết hạn cache, (user_id, username))
+        self._revoked = {}            # token đã đăng xuất -> hết hạn của token (giữ tới lúc đó rồi bỏ)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._rejected = 0
+
+    def _sign(self, payload):
+        return _b64(hmac.new(self._key, payload.encode(), hashlib.sha256).digest())
+
+    def issue(self, user_id, username, now=None):
+        expires = int((now or time.time()) + self.ttl)
+        payload = f"v1.{int(user_id)}.{_b64(username.encode())}.{expires}"
+        return f"{payload}.{self._sign(payload)}"
+
+    def verify(self, token, now=None):
+        """(user_id, username) nếu token hợp lệ và còn hạn, ngược lại None"""
+        if not token or not isinstance(token, str): return None
+        now = now or time.time()
+        with self._lock:
+            if token in self._revoked:
+                self._rejected += 1
+                return None
+            item = self._cache.get(token)
+            if item and item[0] > now:
+                self._cache.move_to_end(token); self._hits += 1
+                return item[1]
+            self._misses += 1
+        try:
+            version, user_id, username, expires, sig = token.split(".")
+            payload = f"{version}.{user_id}.{username}.{expires}"
+            # So sánh bytes: compare_digest với str chứa ký tự ngoài ASCII báo TypeError (cookie hỏng => lỗi cả trang)
+            if version != "v1" or not hmac.compare_digest(sig.encode(), self._sign(payload).encode()) or int(expires) <= now:
+                raise ValueError
+            user = (int(user_id), _unb64(username).decode())
+        except ValueError:
+            with self._lock: self._rejected += 1
+            return None
+        with self._lock:
+            self._cache[token] = (min(now + self.cache_ttl, int(expires)), user)
+            self._cache.move_to_end(token)
+            while len(self._cache) > self.cache_size: self._cache.popitem(last=False)
+        return user
+
+    def revoke(self, token, now=None):
+        """Đăng xuất: token bị từ chối tới khi hết hạn dù chữ ký vẫn đúng.
+        Danh sách chỉ nằm trong RAM của tiến trình (khởi động lại => token chưa hết hạn lại dùng được)"""
+        if not token or not isinstance(token, str): return
+        now = now or time.time()
+        try: expires = int(token.split(".")[3])
+        except (ValueError, IndexError): expires = None   # không đúng định dạng => verify đã từ chối sẵn
+        with self._lock:
+            self._cache.pop(token, None)
+            if expires and expires > now: self._revoked[token] = expires
+            for t in [t for t, exp in self._revoked.items() if exp <= now]: del self._revoked[t]
+
+    def stats(self):
+        with self._lock:
+            return {"cached": len(self._cache), "revoked": len(self._revoked), "hits": self._hits,
+                    "misses": self._misses, "rejected": self._rejected}
+
+
+# --- ĐO ĐỘ TRỄ (p50/p99) ---
+class LatencyStats:
+    """Giữ N mẫu gần nhất cho mỗi chỉ số, tính phân vị khi cần"""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            self._samples.setdefault(name, deque(maxlen=self.window)).append(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try: yield
+        finally: self.record(name, time.perf_counter() - start)
+
+    def summary(self, name):
+        with self._lock: data = sorted(self._samples.get(name, ()))
+        if not data: return None
+        pick = lambda q: data[min(len(data) - 1, int(q * len(data)))] * 1000
+        return {"count": len(data), "p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "max_ms": data[-1] * 1000}
+
+    def names(self):
+        with self._lock: return list(self._samples)
+
+
+# --- BĂM MẬT KHẨU (PBKDF2 / SCRYPT, SALT RIÊNG) ---
+# Định dạng lưu trong users.password:
+#   pbkdf2_sha256$<iterations>$<salt>$<hash>
+#   scrypt$<n>$<r>$<p>$<salt>$<hash>
+#   64 ký tự hex = SHA-256 không salt đời cũ => vẫn đăng nhập được, băm lại ngay khi đăng nhập đúng.
+# Chi phí chỉnh qua app_settings (password_scheme, pbkdf2_iterations, scrypt_n); băm chạy trong
+# thread pool nhỏ (hashlib nhả GIL) để nhiều người đăng nhập cùng lúc không chiếm hết luồng rerun.
+
+PBKDF2_ITERATIONS = 600_000
+SCRYPT_N, SCRYPT_R, SCRYPT_P = 2 ** 14, 8, 1
+SALT_BYTES = 16
+
+
+def legacy_sha256(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+class PasswordHasher:
+    """Băm/kiểm tra mật khẩu theo scheme + tham số chi phí hiện tại"""
+
+    def __init__(self, scheme="pbkdf2_sha256", iterations=PBKDF2_ITERATIONS, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P, workers=2):
+        if scheme not in ("pbkdf2_sha256", "scrypt"): raise ValueError(f"Scheme không hỗ trợ: {scheme}")
+        self.scheme = scheme
+        self.iterations = int(iterations)
+        self.n, self.r, self.p = int(n), int(r), int(p)
+        self.workers = workers
+        self._executor = None
+        self._dummy = None
+        self._lock = threading.Lock()
+
+    def _derive(self, scheme, password, salt, params):
+        if scheme == "pbkdf2_sha256":
+            return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, params[0])
+        n, r, p = params
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * r * n + (1 << 20), dklen=32)
+
+    def hash(self, password):
+        salt = os.urandom(SALT_BYTES)
+        if self.scheme == "pbkdf2_sha256":
+            return f"pbkdf2_sha256${self.iterations}${_b64(salt)}${_b64(self._derive(self.scheme, password, salt, (self.iterations,)))}"
+        params = (self.n, self.r, self.p)
+        return f"scrypt${self.n}${self.r}${self.p}${_b64(salt)}${_b64(self._derive(self.scheme, password, salt, params))}"
+
+    def verify(self, password, stored):
+        if not stored: return False
+        parts = stored.split("$")
+        try:
+            if len(parts) == 1:
+                return hmac.compare_digest(legacy_sha256(password), stored)
+            scheme, *params, salt, digest = parts
+            expected = self._derive(scheme, password, _unb64(salt), tuple(int(x) for x in params))
+            return hmac.compare_digest(expected, _unb64(digest))
+        except (ValueError, TypeError, IndexError):
+            return False
+
+    def dummy_hash(self):
+        """Hash của 1 mật khẩu ngẫu nhiên theo tham số hiện tại (tính 1 lần). Tài khoản không tồn tại vẫn verify
+        với hash này => thời gian trả lời không lộ tên đăng nhập nào có thật"""
+        if self._dummy is None: self._dummy = self.hash(_b64(os.urandom(SALT_BYTES)))
+        return self._dummy
+
+    def needs_rehash(self, stored):
+        """Hash cũ (SHA-256) hoặc khác scheme/tham số hiện tại => băm lại khi đăng nhập đúng"""
+        parts = (stored or "").split("$")
+        if parts[0] != self.scheme: return True
+        current = [str(self.iterations)] if self.scheme == "pbkdf2_sha256" else [str(self.n), str(self.r), str(self.p)]
+        return parts[1:-2] != current
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pwhash")
+            return self._executor
+
+    def verify_in_pool(self, password, stored):
+        return self._pool().submit(self.verify, password, stored).result()
+
+    def hash_in_pool(self, password):
+        return self._pool().submit(self.hash, password).result()
@@ -0,0 +1,136 @@
+import calendar
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# --- XỬ LÝ NGÀY THÁNG & TRẠNG THÁI GÓI ---
+# Bản theo dòng (parse_date / calculate_expiry) dùng cho 1 giá trị lẻ (tab 2, form sửa).
+# Bản vector hóa (parse_dates / add_months / expiry_status) chạy trên cả cột cho bảng lớn.
+
+DATE_FORMATS = ["%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%m/%d/%Y", "%d/%m/%y"]
+DATE_FMT = "%d/%m/%Y"
+
+def parse_date(date_str):
+    for fmt in DATE_FORMATS:
+        try: return datetime.strptime(str(date_str).strip(), fmt)
+        except: continue
+    return None
+
+def calculate_expiry(start_date, months):
+    if not start_date: return None
+    try:
+        year = start_date.year; month = start_date.month + int(months)
+        while month > 12: month -= 12; year += 1
+        day = min(start_date.day, calendar.monthrange(year, month)[1])
+        return datetime(year, month, day)
+    except: return None
+
+def to_iso_date(date_str):
+    """Chuỗi ngày bất kỳ (theo parse_date) -> YYYY-MM-DD; không đọc được thì giữ nguyên"""
+    dt = parse_date(date_str)
+    return dt.strftime("%Y-%m-%d") if dt else date_str
+
+def parse_dates(values):
+    """Parse cả cột ngày, kết quả giống hệt parse_date() từng dòng.
+    Chỉ parse các giá trị duy nhất; mỗi định dạng chạy 1 lượt pd.to_datetime trên
+    phần còn lại theo đúng thứ tự ưu tiên của parse_date (cột đồng nhất => 1 lượt là xong)."""
+    s = pd.Series(values, copy=False)
+    uniq = pd.unique(s.astype(str).str.strip())
+    parsed = pd.Series(pd.NaT, index=uniq, dtype="datetime64[us]")
+    remaining = pd.Index(uniq)
+    for fmt in DATE_FORMATS:
+        if remaining.empty: break
+        got = pd.to_datetime(remaining, format=fmt, errors="coerce").as_unit("us")
+        ok = ~got.isna()
+        if ok.any():
+            parsed[remaining[ok]] = got[ok]
+            remaining = remaining[~ok]
+    # pandas 2 parse ở độ phân giải ns => ngày ngoài 1677–2262 thành NaT; phần sót (ít) đi qua parse_date
+    for key in remaining:
+        dt = parse_date(key)
+        if dt: parsed[key] = dt
+    return pd.Series(parsed.reindex(s.astype(str).str.strip()).to_numpy(), index=s.index, name=s.name)
+
+def iso_dates(values):
+    """Bản vector của to_iso_date: cột ngày -> chuỗi YYYY-MM-DD, giá trị không đọc được giữ nguyên"""
+    parsed = parse_dates(values)
+    raw = pd.Series(values, copy=False).astype(object)
+    return parsed.dt.strftime("%Y-%m-%d").astype(object).where(parsed.notna(), raw.to_numpy())
+
+def add_months(dates, months):
+    """Cộng tháng theo calculate_expiry(): kẹp về ngày cuối tháng (31/01 + 1 => 28|29/02).
+    Trả về mảng datetime64[D]; NaT khi ngày lỗi hoặc tháng đích không hợp lệ."""
+    dates = pd.Series(dates).reset_index(drop=True)
+    months = np.asarray(months, dtype=np.int64)
+    valid = dates.notna().to_numpy().copy()
+    y = dates.dt.year.fillna(1970).to_numpy(np.int64)
+    m = dates.dt.month.fillna(1).to_numpy(np.int64)
+    d = dates.dt.day.fillna(1).to_numpy(np.int64)
+    raw_month = m + months
+    total = y * 12 + raw_month - 1
+    ny = total // 12
+    valid &= (raw_month >= 1) & (ny <= 9999)   # calendar.monthrange / datetime báo lỗi => "Lỗi"
+    total = np.where(valid, total, 1970 * 12)
+    first = (total - 1970 * 12).astype("datetime64[M]")
+    first_day = first.astype("datetime64[D]")
+    dim = ((first + 1).astype("datetime64[D]") - first_day).astype(np.int64)
+    exp = first_day + (np.minimum(d, dim) - 1).astype("timedelta64[D]")
+    exp[~valid] = np.datetime64("NaT")
+    return exp
+
+def _labels_by_unique(keys, make_label):
+    # Nhãn chỉ phụ thuộc vào key => định dạng chuỗi 1 lần cho mỗi giá trị duy nhất
+    uniq, inv = np.unique(keys, return_inverse=True)
+    labels = np.array([make_label(k) for k in uniq.tolist()], dtype=object)
+    return labels[inv.reshape(-1)]
+
+def status_label(days):
+    if days < 0: return f"🔴 ĐÃ HẾT ({abs(days)}d)"
+    if days <= 3: return f"🟡 Sắp hết ({days}d)"
+    return f"🟢 Còn {days} ngày"
+
+def expiry_status(exp, today=None):
+    """Từ mảng ngày hết hạn datetime64[D] => (chuỗi 'Hết Hạn', chuỗi 'Trạng Thái')"""
+    today = np.datetime64(today or datetime.now(), "us")
+    exp = np.asarray(exp, dtype="datetime64[D]")
+    ok = ~np.isnat(exp)
+    exp_str = np.full(len(exp), "Lỗi", dtype=object)
+    status = np.full(len(exp), "⚪ Lỗi", dtype=object)
+    if ok.any():
+        exp_ok = exp[ok]
+        # (exp - today).days của datetime => làm tròn xuống theo ngày
+        days = (exp_ok.astype("datetime64[us]") - today) // np.timedelta64(1, "D")
+        exp_str[ok] = _labels_by_unique(exp_ok.astype(np.int64),
+                                        lambda k: (np.datetime64(k, "D").astype(datetime)).strftime(DATE_FMT))
+        status[ok] = _labels_by_unique(days.astype(np.int64), status_label)
+    return exp_str, status
+
+def process_data_for_editor(df, today=None):
+    if df.empty: return df
+    reg = parse_dates(df['reg_date'])
+    duration = pd.to_numeric(df['duration'], errors='coerce').fillna(1).astype(int)
+    exp_str, status = expiry_status(add_months(reg, duration.to_numpy()), today)
+    out = df.assign(duration=duration, reg_date_obj=reg.to_numpy(), **{'Hết Hạn': exp_str, 'Trạng Thái': status})
+    return out.rename(columns={"name": "Tên Khách Hàng", "device_info": "Thông tin khách hàng", "reg_date_obj": "Ngày ĐK", "duration": "Gói (tháng)"})
+
+def revenue_by_month(df, max_months=1200):
+    """Bản pandas của bảng revenue_monthly (chế độ khách): DataFrame ym, reg_months, active_subs.
+    reg_months = tổng số tháng đăng ký trong tháng; active_subs = số gói phủ tháng đó."""
+    empty = pd.DataFrame({"ym": pd.Series(dtype=object), "reg_months": pd.Series(dtype=np.int64), "active_subs": pd.Series(dtype=np.int64)})
+    if df.empty: return empty
+    reg = parse_dates(df['reg_date'])
+    dur = pd.to_numeric(df['duration'], errors='coerce')
+    ok = (reg.notna() & dur.notna()).to_numpy()
+    if not ok.any(): return empty
+    base = (reg.dt.year * 12 + reg.dt.month - 1).to_numpy()[ok].astype(np.int64)
+    dur = dur.to_numpy()[ok].astype(np.int64)
+    reg_months = pd.Series(dur).groupby(base).sum()
+    # Gói n tháng => n tháng liên tiếp kể từ tháng đăng ký
+    span = np.clip(dur, 0, max_months)
+    starts = np.repeat(np.cumsum(span) - span, span)
+    months = np.repeat(base, span) + (np.arange(span.sum()) - starts)
+    active = pd.Series(months).value_counts()
+    out = pd.concat([reg_months.rename("reg_months"), active.rename("active_subs")], axis=1).fillna(0).astype(np.int64)
+    out = out[(out.index // 12 <= 9999) & ((out["reg_months"] != 0) | (out["active_subs"] != 0))].sort_index()
+    ym = [f"{m // 12:04d}-{m % 12 + 1:02d}" for m in out.index.tolist()]
+    return out.reset_index(drop=True).assign(ym=ym)[["ym", "reg_months", "active_subs"]]
@@ -0,0 +1,769 @@
+import sqlite3
+import re
+import sys
+import threading
+import queue
+import time
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, timedelta
+import pandas as pd
+from member_dates import iso_dates, to_iso_date
+
+# --- LỚP KẾT NỐI SQLITE DÙNG CHUNG (POOL) ---
+# Mỗi tiến trình Streamlit giữ 1 pool duy nhất (xem get_pool() trong membermanagement.py).
+# Kết nối sống lâu => sqlite3 tự cache prepared statement theo câu SQL (cached_statements).
+
+PRAGMAS = {
+    "journal_mode": "WAL",      # Đọc song song với ghi, hết cảnh "database is locked"
+    "synchronous": "NORMAL",    # Đủ an toàn với WAL, nhanh hơn FULL nhiều
+    "busy_timeout": 5000,       # Chờ tối đa 5s khi có writer khác thay vì báo lỗi ngay
+    "foreign_keys": "ON",
+    "temp_store": "MEMORY",
+    "cache_size": -16000,       # ~16 MB page cache mỗi kết nối
+    "mmap_size": 134217728,     # 128 MB memory-mapped I/O
+}
+
+
+class PoolTimeout(Exception):
+    """Không lấy được kết nối trong thời gian cho phép"""
+
+
+class ConnectionPool:
+    """Pool kết nối SQLite an toàn đa luồng, tạo kết nối lười và tái sử dụng"""
+
+    def __init__(self, db_file, max_size=8, timeout=30.0, cached_statements=256):
+        self.db_file = db_file
+        self.max_size = max_size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._open = 0
+        self._in_use = 0
+        self._acquired = 0
+        self._waited = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._closed = False
+        self.trace = None   # callback(câu SQL) gắn vào mọi kết nối khi mượn, vd. Profiler.trace
+
+    def _new_connection(self):
+        conn = sqlite3.connect(self.db_file, timeout=PRAGMAS["busy_timeout"] / 1000,
+                               check_same_thread=False, cached_statements=self.cached_statements)
+        for key, val in PRAGMAS.items():
+            conn.execute(f"PRAGMA {key}={val}")
+        return conn
+
+    def acquire(self):
+        if self._closed: raise PoolTimeout("Pool đã đóng")
+        start = time.perf_counter()
+        conn = None
+        try: conn = self._idle.get_nowait()
+        except queue.Empty:
+            create = False
+            with self._lock:
+                if self._open < self.max_size:
+                    self._open += 1; create = True
+            if create:
+                try: conn = self._new_connection()
+                except Exception:
+                    with self._lock: self._open -= 1
+                    raise
+            else:
+                try: conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise PoolTimeout(f"Hết kết nối rảnh sau {self.timeout}s ({self.max_size} đang bận)")
+        waited = time.perf_counter() - start
+        with self._lock:
+            self._in_use += 1; self._acquired += 1
+            self._wait_total += waited; self._wait_max = max(self._wait_max, waited)
+            if waited > 0.001: self._waited += 1
+        if self.trace is not None: conn.set_trace_callback(self.trace)
+        return conn
+
+    def release(self, conn):
+        with self._lock: self._in_use -= 1
+        if self.trace is not None: conn.set_trace_callback(None)
+        if self._closed:
+            conn.close()
+            with self._lock: self._open -= 1
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Mượn 1 kết nối; tự commit khi xong, rollback nếu có lỗi"""
+        conn = self.acquire()
+        try:
+            yield conn
+            if conn.in_transaction: conn.commit()
+        except BaseException:
+            if conn.in_transaction: conn.rollback()
+            raise
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "open": self._open,
+                "in_use": self._in_use,
+                "idle": self._open - self._in_use,
+                "max_size": self.max_size,
+                "acquired": self._acquired,
+                "waited": self._waited,
+                "avg_wait_ms": (self._wait_total / self._acquired * 1000) if self._acquired else 0.0,
+                "max_wait_ms": self._wait_max * 1000,
+            }
+
+    def close(self):
+        self._closed = True
+        while True:
+            try: conn = self._idle.get_nowait()
+            except queue.Empty: break
+            conn.close()
+            with self._lock: self._open -= 1
+
+
+# --- CACHE KẾT QUẢ THEO OWNER ---
+# Mỗi lần rerun Streamlit dựng lại cả 3 tab => cùng 1 owner bị đọc lại nhiều lần. Cache dùng chung
+# mọi phiên (xem get_cache()), giới hạn số mục và tổng byte (LRU) + TTL; mọi lệnh ghi của owner gọi invalidate(owner_id).
+# Giá trị trả về dùng chung giữa các phiên => nơi gọi không được sửa tại chỗ (copy trước khi sửa).
+
+def _text_bytes(values, sample=64):
+    """Phần chuỗi Python mà memory_usage(deep=False) bỏ qua (chỉ đếm con trỏ): ước theo 1 mẫu rải đều"""
+    if not len(values): return 0
+    picked = values[::max(1, len(values) // sample)]
+    return int(sum(sys.getsizeof(x) for x in picked) / len(picked) * len(values))
+
+def approx_nbytes(value):
+    """Cỡ gần đúng (byte) của 1 giá trị cache, đủ rẻ để tính mỗi lần lưu: DataFrame theo memory_usage(deep=False)
+    + chuỗi Python ước theo mẫu (deep=True phải duyệt từng ô); tuple/list/dict cộng dồn từng phần"""
+    if isinstance(value, pd.DataFrame):
+        n = int(value.memory_usage(index=True, deep=False).sum())
+        for _, col in value.items():
+            if isinstance(col.dtype, pd.CategoricalDtype): col = col.cat.categories
+            if col.dtype == object or getattr(col.dtype, "storage", None) == "python": n += _text_bytes(col)
+        return n
+    if isinstance(value, (tuple, list)): return sys.getsizeof(value) + sum(approx_nbytes(x) for x in value)
+    if isinstance(value, dict): return sys.getsizeof(value) + sum(approx_nbytes(k) + approx_nbytes(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+class OwnerCache:
+    """Cache LRU + TTL an toàn đa luồng, khóa theo (owner_id, key), xóa theo owner.
+    max_bytes: giới hạn tổng cỡ ước lượng (approx_nbytes); 1 giá trị lớn hơn cả giới hạn thì không lưu"""
+
+    def __init__(self, max_entries=256, ttl=300.0, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data = OrderedDict()   # (owner_id, key) -> (hết hạn lúc, giá trị, byte)
+        self._bytes = 0
+        self._gen = {}               # owner_id -> thế hệ, tăng sau mỗi lần invalidate
+        self._epoch = 0              # tăng sau mỗi lần clear()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get(self, owner_id, key, loader):
+        """Trả giá trị đã cache hoặc gọi loader() rồi lưu lại"""
+        k = (owner_id, key)
+        with self._lock:
+            item = self._data.get(k)
+            if item and item[0] > time.monotonic():
+                self._data.move_to_end(k); self._hits += 1
+                return item[1]
+            self._misses += 1
+            gen = (self._epoch, self._gen.get(owner_id, 0))
+        value = loader()
+        size = approx_nbytes(value)
+        with self._lock:
+            # Có lệnh ghi xen giữa lúc đang tải => kết quả có thể đã cũ, không lưu
+            if (self._epoch, self._gen.get(owner_id, 0)) == gen: self._store(k, value, size)
+        return value
+
+    def put(self, owner_id, key, value):
+        """Ghi đè 1 mục (vd. trang đang xem vừa được vá sau khi sửa vài dòng)"""
+        size = approx_nbytes(value)
+        with self._lock: self._store((owner_id, key), value, size)
+
+    def _store(self, k, value, size):
+        # Gọi khi đang giữ _lock
+        old = self._data.pop(k, None)
+        if old: self._bytes -= old[2]
+        if self.max_bytes is not None and size > self.max_bytes: return
+        self._data[k] = (time.monotonic() + self.ttl, value, size)
+        self._bytes += size
+        while len(self._data) > self.max_entries or (self.max_bytes is not None and self._bytes > self.max_bytes):
+            self._bytes -= self._data.popitem(last=False)[1][2]; self._evictions += 1
+
+    def invalidate(self, owner_id):
+        with self._lock:
+            self._gen[owner_id] = self._gen.get(owner_id, 0) + 1
+            for k in [k for k in self._data if k[0] == owner_id]: self._bytes -= self._data.pop(k)[2]
+            self._invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "owners": len({k[0] for k in self._data}),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
+
+
+# --- SCHEMA & MIGRATION ---
+# Phiên bản schema lưu trong PRAGMA user_version. Mỗi migration chạy trong 1 transaction riêng,
+# DB cũ (user_version = 0) được nâng cấp tại chỗ theo thứ tự.
+
+# Ngày hết hạn = reg_date + duration tháng, kẹp về cuối tháng giống calculate_expiry()
+EXPIRY_SQL = """CASE
+        WHEN date(reg_date) IS NULL OR duration IS NULL THEN NULL
+        WHEN CAST(strftime('%m', reg_date) AS INTEGER) + duration < 1 THEN NULL
+        WHEN strftime('%d', date(reg_date, printf('%+d months', duration))) = strftime('%d', reg_date)
+            THEN date(reg_date, printf('%+d months', duration))
+        ELSE date(reg_date, 'start of month', printf('%+d months', duration + 1), '-1 day') END"""
+
+CUSTOMER_COLUMNS = "id, owner_id, name, device_info, reg_date, duration"
+
+def _columns(conn, table):
+    return [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+
+def _migration_1_base(conn):
+    """Bảng users/customers gốc; DB đời đầu (dulieu_game.db) chưa có owner_id"""
+    conn.execute('''CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                password TEXT NOT NULL
+                )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS customers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            owner_id INTEGER, 
+            name TEXT NOT NULL,
+            device_info TEXT,
+            reg_date TEXT,
+            duration INTEGER)''')
+    if "owner_id" not in _columns(conn, "customers"):
+        conn.execute("ALTER TABLE customers ADD COLUMN owner_id INTEGER")
+
+def _migration_2_iso_expiry(conn):
+    """reg_date dd/mm/YYYY -> ISO YYYY-MM-DD, thêm cột expiry_date (STORED) và index theo owner"""
+    if "expiry_date" not in _columns(conn, "customers"):
+        seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name='customers'").fetchone()
+        conn.execute(f'''CREATE TABLE customers_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                owner_id INTEGER,
+                name TEXT NOT NULL,
+                device_info TEXT,
+                reg_date TEXT,
+                duration INTEGER,
+                expiry_date TEXT GENERATED ALWAYS AS ({EXPIRY_SQL}) STORED)''')
+        cur = conn.execute(f"SELECT {CUSTOMER_COLUMNS} FROM customers")
+        while True:
+            rows = cur.fetchmany(5000)
+            if not rows: break
+            # Ngày không đọc được giữ nguyên chuỗi gốc (expiry_date = NULL => hiển thị "Lỗi" như cũ)
+            conn.executemany(f"INSERT INTO customers_new ({CUSTOMER_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)",
+                             [r[:4] + (to_iso_date(r[4]), r[5]) for r in rows])
+        conn.execute("DROP TABLE customers")
+        conn.execute("ALTER TABLE customers_new RENAME TO customers")
+        if seq: conn.execute("UPDATE sqlite_sequence SET seq=max(seq, ?) WHERE name='customers'", (seq[0],))
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customers_owner_expiry ON customers(owner_id, expiry_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customers_owner_name ON customers(owner_id, name)")
+
+# FTS5 cho ô tìm kiếm: unicode61 remove_diacritics bỏ dấu ("hung" khớp "Hùng") nhưng coi "đ" là chữ riêng
+# => trigger thay đ/Đ bằng d/D trước khi đưa vào index. rowid của customers_fts = customers.id.
+# Cột owner giữ token 'o<owner_id>': MATCH lọc theo owner ngay trong index (xem fts_query). Từ tìm kiếm là
+# tiền tố => không có prefix index, FTS5 phải gộp doclist của mọi từ khớp tiền tố ở MỌI owner rồi mới AND với
+# owner; có prefix index thì nhảy thẳng theo doclist của owner. 1-6 ký tự đủ cho gần hết âm tiết tiếng Việt,
+# tiền tố dài hơn vốn ít dòng khớp. Đổi lại index ~4 lần lớn hơn (300k dòng: 8.7 -> 39 MB), nhập chậm hơn.
+FTS_PREFIX = "1 2 3 4 5 6"
+def _fold_sql(col): return f"replace(replace({col}, 'đ', 'd'), 'Đ', 'D')"
+def _owner_token_sql(col): return f"'o' || {col}"
+
+FTS_TRIGGERS = {
+    "customers_fts_ai": f"""AFTER INSERT ON customers BEGIN
+        INSERT INTO customers_fts (rowid, owner, name, device_info)
+        VALUES (new.id, {_owner_token_sql('new.owner_id')}, {_fold_sql('new.name')}, {_fold_sql('new.device_info')}); END""",
+    "customers_fts_ad": "AFTER DELETE ON customers BEGIN DELETE FROM customers_fts WHERE rowid=old.id; END",
+    "customers_fts_au": f"""AFTER UPDATE OF owner_id, name, device_info ON customers BEGIN
+        UPDATE customers_fts SET owner={_owner_token_sql('new.owner_id')}, name={_fold_sql('new.name')},
+            device_info={_fold_sql('new.device_info')} WHERE rowid=new.id; END""",
+}
+
+def _migration_3_fts(conn):
+    """Index FTS5 (owner, name, device_info) đồng bộ bằng trigger; SQLite không có FTS5 => bỏ qua, tìm bằng LIKE"""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS customers_fts USING fts5("
+                     f"owner, name, device_info, tokenize='unicode61 remove_diacritics 2', prefix='{FTS_PREFIX}')")
+    except sqlite3.OperationalError:
+        return
+    conn.execute("DELETE FROM customers_fts")
+    conn.execute(f"INSERT INTO customers_fts (rowid, owner, name, device_info) "
+                 f"SELECT id, {_owner_token_sql('owner_id')}, {_fold_sql('name')}, {_fold_sql('device_info')} FROM customers")
+    for name, body in FTS_TRIGGERS.items():
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+
+# Doanh thu theo tháng, cộng dồn bằng trigger => hộp thoại doanh thu chỉ đọc vài dòng.
+#   reg_months  : tổng số tháng của các gói đăng ký trong tháng đó (tính hết vào tháng đăng ký)
+#   active_subs : số gói đang chạy trong tháng đó (gói n tháng chia đều cho n tháng nó phủ)
+# Doanh thu = số trên × giá/tháng (giá nhập ở giao diện nên không lưu). Trigger không dùng được CTE
+# => bảng month_offsets(0..MAX_SPREAD_MONTHS-1) để sinh các tháng của 1 gói.
+MAX_SPREAD_MONTHS = 1200
+
+def _revenue_rows_sql(p, sign="1", table=None):
+    """SELECT (owner_id, ym, reg_months, active_subs) của 1 khách (p = 'new'/'old' trong trigger)
+    hoặc của cả bảng (table = 'customers c', p = 'c')"""
+    valid = f"{p}.owner_id IS NOT NULL AND date({p}.reg_date) IS NOT NULL AND {p}.duration IS NOT NULL"
+    return f"""SELECT * FROM (
+            SELECT {p}.owner_id AS owner_id, strftime('%Y-%m', {p}.reg_date) AS ym,
+                   {sign} * {p}.duration AS reg_months, 0 AS active_subs {f"FROM {table}" if table else ""} WHERE {valid}
+            UNION ALL
+            SELECT {p}.owner_id, strftime('%Y-%m', {p}.reg_date, 'start of month', printf('%+d months', n)), 0, {sign}
+            FROM month_offsets{f", {table}" if table else ""} WHERE n < {p}.duration AND {valid}) WHERE ym IS NOT NULL"""
+
+def _revenue_apply_sql(p, sign):
+    return f"""INSERT INTO revenue_monthly (owner_id, ym, reg_months, active_subs) {_revenue_rows_sql(p, sign)}
+        ON CONFLICT (owner_id, ym) DO UPDATE SET reg_months = reg_months + excluded.reg_months,
+            active_subs = active_subs + excluded.active_subs;
+        DELETE FROM revenue_monthly WHERE owner_id = {p}.owner_id AND reg_months = 0 AND active_subs = 0;"""
+
+REVENUE_TRIGGERS = {
+    "revenue_ai": f"AFTER INSERT ON customers BEGIN {_revenue_apply_sql('new', '1')} END",
+    "revenue_ad": f"AFTER DELETE ON customers BEGIN {_revenue_apply_sql('old', '-1')} END",
+    "revenue_au": f"""AFTER UPDATE OF owner_id, reg_date, duration ON customers BEGIN
+        {_revenue_apply_sql('old', '-1')} {_revenue_apply_sql('new', '1')} END""",
+}
+
+def _migration_4_revenue(conn):
+    """Bảng revenue_monthly (owner_id, ym) + trigger cộng/trừ khi thêm, sửa, xóa khách"""
+    conn.execute("CREATE TABLE IF NOT EXISTS month_offsets (n INTEGER PRIMARY KEY)")
+    conn.executemany("INSERT OR IGNORE INTO month_offsets (n) VALUES (?)", [(i,) for i in range(MAX_SPREAD_MONTHS)])
+    conn.execute('''CREATE TABLE IF NOT EXISTS revenue_monthly (
+                owner_id INTEGER NOT NULL,
+                ym TEXT NOT NULL,
+                reg_months INTEGER NOT NULL DEFAULT 0,
+                active_subs INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (owner_id, ym)) WITHOUT ROWID''')
+    for name, body in REVENUE_TRIGGERS.items():
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+    rebuild_revenue(conn)
+
+# Hàng đợi sự kiện hết hạn do bộ quét hằng ngày (member_scheduler.py) ghi ra. Bất biến sau mỗi lần quét
+# ngày D (scheduler_state 'expiry_scan_date'), với N = 'expiring_days':
+#   mọi khách có expiry_date <= D                   có 1 sự kiện 'expired'
+#   mọi khách có D < expiry_date <= D + N + 1       có 1 sự kiện 'expiring'   (cùng quy ước status_filter)
+# Trigger giữ bất biến giữa 2 lần quét: khách thêm/sửa/xóa => bỏ sự kiện cũ, sinh lại theo ngày D.
+# Sự kiện đã gửi (notified_at) được giữ lại khi sửa khách => không gửi lại; sự kiện của ngày hết hạn cũ
+# không còn khớp customers.expiry_date nên nơi đọc (đếm, ô thông báo) tự bỏ qua.
+def _expiry_event_sql(kind, cond):
+    return f"""INSERT OR IGNORE INTO expiry_events (owner_id, customer_id, kind, expiry_date, scan_date)
+        SELECT new.owner_id, new.id, '{kind}', new.expiry_date, d.value
+        FROM scheduler_state d JOIN scheduler_state n ON n.key = 'expiring_days'
+        WHERE d.key = 'expiry_scan_date' AND new.owner_id IS NOT NULL AND {cond};"""
+
+_EXPIRY_EVENTS_NEW = (_expiry_event_sql("expired", "new.expiry_date <= d.value") +
+                      _expiry_event_sql("expiring", "new.expiry_date > d.value AND "
+                                        "new.expiry_date <= date(d.value, printf('%+d days', n.value + 1))"))
+
+EXPIRY_TRIGGERS = {
+    "expiry_events_ai": f"AFTER INSERT ON customers BEGIN {_EXPIRY_EVENTS_NEW} END",
+    "expiry_events_ad": "AFTER DELETE ON customers BEGIN DELETE FROM expiry_events WHERE customer_id = old.id; END",
+    # Sửa tên/thông tin vẫn ghi lại reg_date, duration (UPDATE_CUSTOMER_SQL) => chỉ chạy khi ngày hết hạn/chủ thực sự đổi
+    "expiry_events_au": f"""AFTER UPDATE OF owner_id, reg_date, duration ON customers
+        WHEN old.expiry_date IS NOT new.expiry_date OR old.owner_id IS NOT new.owner_id BEGIN
+        DELETE FROM expiry_events WHERE customer_id = old.id AND notified_at IS NULL;
+        UPDATE expiry_events SET owner_id = new.owner_id WHERE customer_id = old.id AND owner_id IS NOT new.owner_id;
+        {_EXPIRY_EVENTS_NEW} END""",
+}
+
+def _migration_5_expiry_events(conn):
+    """Hàng đợi expiry_events + scheduler_state + index expiry_date (quét theo khoảng ngày cho mọi owner)"""
+    conn.execute("CREATE TABLE IF NOT EXISTS scheduler_state (key TEXT PRIMARY KEY, value TEXT)")
+    conn.execute('''CREATE TABLE IF NOT EXISTS expiry_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                owner_id INTEGER NOT NULL,
+                customer_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                expiry_date TEXT NOT NULL,
+                scan_date TEXT NOT NULL,
+                notified_at TEXT,
+                UNIQUE (customer_id, kind, expiry_date))''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_expiry_events_owner ON expiry_events(owner_id, kind, expiry_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_expiry_events_pending ON expiry_events(notified_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customers_expiry ON customers(expiry_date)")
+    for name, body in EXPIRY_TRIGGERS.items():
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+
+def _migration_6_app_settings(conn):
+    """Bảng app_settings + khóa ký cookie phiên (ngẫu nhiên, sinh 1 lần cho mỗi file DB)"""
+    conn.execute("CREATE TABLE IF NOT EXISTS app_settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    conn.execute("INSERT OR IGNORE INTO app_settings (key, value) VALUES ('session_secret', lower(hex(randomblob(32))))")
+
+def _migration_7_expiry_events_update(conn):
+    """Trigger expiry_events_au chỉ chạy khi ngày hết hạn/chủ đổi và giữ sự kiện đã gửi (sửa tên không gửi lại)"""
+    conn.execute("DROP TRIGGER IF EXISTS expiry_events_au")
+    conn.execute(f"CREATE TRIGGER expiry_events_au {EXPIRY_TRIGGERS['expiry_events_au']}")
+
+def _migration_8_fts_owner(conn):
+    """Dựng lại customers_fts kèm cột owner + prefix index (DB tạo trước khi migration 3 có 2 thứ này)"""
+    if not has_fts(conn) or "owner" in _columns(conn, "customers_fts"): return
+    for name in FTS_TRIGGERS: conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute("DROP TABLE customers_fts")
+    _migration_3_fts(conn)
+
+MIGRATIONS = [
+    (1, "Bảng users/customers, bổ sung owner_id", _migration_1_base),
+    (2, "Ngày ISO + expiry_date + index (owner_id, expiry_date), (owner_id, name)", _migration_2_iso_expiry),
+    (3, "Index tìm kiếm FTS5 customers_fts + trigger đồng bộ", _migration_3_fts),
+    (4, "Bảng doanh thu theo tháng revenue_monthly + trigger", _migration_4_revenue),
+    (5, "Hàng đợi sự kiện hết hạn expiry_events + scheduler_state", _migration_5_expiry_events),
+    (6, "Bảng app_settings + khóa ký phiên đăng nhập", _migration_6_app_settings),
+    (7, "Trigger expiry_events_au: bỏ qua khi ngày hết hạn không đổi, giữ sự kiện đã gửi", _migration_7_expiry_events_update),
+    (8, "customers_fts thêm cột owner: tìm kiếm chỉ đọc index của 1 owner", _migration_8_fts_owner),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def has_fts(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name='customers_fts'").fetchone() is not None
+
+def migrate(conn):
+    """Chạy các migration còn thiếu; an toàn khi nhiều tiến trình cùng khởi động. Trả về list version đã chạy"""
+    applied = []
+    for version, _, fn in MIGRATIONS:
+        if schema_version(conn) >= version: continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if schema_version(conn) < version:   # tiến trình khác có thể vừa chạy xong
+                fn(conn)
+                conn.execute(f"PRAGMA user_version={version}")
+                applied.append(version)
+            conn.commit()
+        except BaseException:
+            conn.rollback(); raise
+    return applied
+
+def app_setting(conn, key, default=None):
+    row = conn.execute("SELECT value FROM app_settings WHERE key=?", (key,)).fetchone()
+    return row[0] if row else default
+
+def claim_orphans(conn, owner_id):
+    """Gán khách chưa có chủ (dữ liệu từ DB đời đầu) cho 1 tài khoản"""
+    return conn.execute("UPDATE customers SET owner_id=? WHERE owner_id IS NULL", (owner_id,)).rowcount
+
+
+# --- NHẬP HÀNG LOẠT (BULK IMPORT) ---
+INSERT_CUSTOMER_SQL = "INSERT INTO customers (owner_id, name, device_info, reg_date, duration) VALUES (?, ?, ?, ?, ?)"
+
+def customer_rows(df_clean, owner_id):
+    """Chuyển DataFrame (đầu ra smart_import) thành list tuple kiểu Python thuần để bind vào SQL"""
+    names = df_clean['name'].fillna("Khách Nhập").astype(str).tolist()
+    devices = df_clean['device_info'].fillna("").astype(str).tolist()
+    dates = iso_dates(df_clean['reg_date']).tolist()
+    durations = df_clean['duration'].astype(int).tolist()
+    return [(owner_id, n, d, dt, dur) for n, d, dt, dur in zip(names, devices, dates, durations)]
+
+UPDATE_CUSTOMER_SQL = "UPDATE customers SET name=?, device_info=?, reg_date=?, duration=? WHERE id=? AND owner_id=?"
+DELETE_CUSTOMER_SQL = "DELETE FROM customers WHERE id=? AND owner_id=?"
+
+def apply_customer_changes(pool, owner_id, updates=(), deletes=(), inserts=()):
+    """Áp 1 lô thay đổi từ data_editor trong 1 transaction (executemany cho từng loại).
+    updates: [(name, device_info, reg_date, duration, id)], deletes: [id], inserts: [(name, device_info, reg_date, duration)]
+    Lỗi bất kỳ => rollback cả lô. Trả về số dòng đã sửa/xóa/thêm."""
+    with pool.connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        updated = conn.executemany(UPDATE_CUSTOMER_SQL, [u + (owner_id,) for u in updates]).rowcount if updates else 0
+        deleted = conn.executemany(DELETE_CUSTOMER_SQL, [(i, owner_id) for i in deletes]).rowcount if deletes else 0
+        inserted = conn.executemany(INSERT_CUSTOMER_SQL, [(owner_id,) + r for r in inserts]).rowcount if inserts else 0
+    return {"updated": updated, "deleted": deleted, "inserted": inserted}
+
+def customers_by_ids(conn, owner_id, ids):
+    """Đọc lại đúng các dòng vừa sửa (làm mới 1 phần trang đang xem)"""
+    ids = list(ids)
+    if not ids: return pd.DataFrame(columns=[c.strip() for c in CUSTOMER_COLUMNS.split(",")])
+    marks = ",".join("?" * len(ids))
+    return pd.read_sql_query(f"SELECT {CUSTOMER_COLUMNS} FROM customers WHERE owner_id=? AND id IN ({marks})",
+                             conn, params=[owner_id] + ids)
+
+def bulk_insert_frames(pool, owner_id, frames, chunk_size=5000, progress=None):
+    """Ghi các lô DataFrame (member_import.iter_import_frames) trong 1 transaction: đọc lô nào ghi lô đó,
+    executemany theo từng chunk. Lỗi giữa chừng => rollback toàn bộ, không để lại dữ liệu nhập dở.
+    progress(done) gọi sau mỗi lô. Trả về thống kê số dòng & tốc độ."""
+    total = 0
+    start = time.perf_counter()
+    with pool.connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        for df_clean in frames:
+            rows = customer_rows(df_clean, owner_id)
+            for i in range(0, len(rows), chunk_size):
+                conn.executemany(INSERT_CUSTOMER_SQL, rows[i:i + chunk_size])
+            total += len(rows)
+            if progress: progress(total)
+    elapsed = time.perf_counter() - start
+    return {"rows": total, "seconds": elapsed, "rows_per_sec": total / elapsed if elapsed > 0 else float(total)}
+
+
+
+# --- TRUY VẤN THEO TRẠNG THÁI (DÙNG INDEX owner_id, expiry_date) ---
+# Quy ước giống process_data_for_editor: days = (expiry - now).days = (expiry - hôm nay) - 1
+#   expired  : days < 0        <=> expiry_date <= hôm nay
+#   expiring : 0 <= days <= N  <=> hôm nay < expiry_date <= hôm nay + N + 1
+#   active   : days > N
+#   error    : không tính được ngày hết hạn
+STATUS_BUCKETS = ["expired", "expiring", "active", "error"]
+EXPIRING_DAYS = 3
+
+def _iso(d): return d.isoformat()
+
+def status_filter(bucket, today=None, days=EXPIRING_DAYS):
+    """Điều kiện SQL + params cho 1 nhóm trạng thái.
+    Với 'expired', days là số ngày quá hạn tối thiểu (0 = mọi khách đã hết hạn)."""
+    today = today or date.today()
+    if bucket == "expired":
+        return "expiry_date <= ?", [_iso(today - timedelta(days=days))]
+    if bucket == "expiring":
+        return "expiry_date > ? AND expiry_date <= ?", [_iso(today), _iso(today + timedelta(days=days + 1))]
+    if bucket == "active":
+        return "expiry_date > ?", [_iso(today + timedelta(days=days + 1))]
+    if bucket == "error":
+        return "expiry_date IS NULL", []
+    raise ValueError(f"Nhóm trạng thái không hợp lệ: {bucket}")
+
+def _like_pattern(text):
+    return "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+def fold_diacritics(text):
+    """Bỏ dấu tiếng Việt (kể cả đ/Đ), giữ nguyên hoa/thường: 'Hùng Đức' -> 'Hung Duc'"""
+    text = unicodedata.normalize("NFD", str(text).replace("đ", "d").replace("Đ", "D"))
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+def search_frame(df, search):
+    """Tìm trên DataFrame (chế độ khách), giống FTS: bỏ dấu cả 2 phía ("hung" khớp "Hùng"),
+    tìm chuỗi thường không phải regex, bỏ qua NaN"""
+    needle = fold_diacritics(search).lower()
+    text = (df['name'].fillna("").astype(str) + "\n" + df['device_info'].fillna("").astype(str)).map(fold_diacritics).str.lower()
+    return df[text.str.contains(needle, regex=False).to_numpy()]
+
+def fts_query(search, owner_id=None):
+    """Ô tìm kiếm -> cú pháp MATCH: mỗi từ là 1 tiền tố, các từ AND với nhau, chỉ tìm trong name/device_info.
+    owner_id => thêm điều kiện token owner. Không có từ nào => None"""
+    tokens = re.findall(r"\w+", fold_diacritics(search))
+    if not tokens: return None
+    terms = "{name device_info} : (" + " ".join(f'"{t}"*' for t in tokens) + ")"
+    return terms if owner_id is None else f'owner : "o{int(owner_id)}" AND {terms}'
+
+def customer_where(owner_id, bucket=None, search=None, today=None, days=EXPIRING_DAYS, fts=False):
+    """Mệnh đề WHERE dùng chung cho truy vấn danh sách, phân trang và đếm.
+    fts=True: tìm qua customers_fts (cần JOIN, xem _customer_from); không thì LIKE chuỗi con."""
+    where, params = ["c.owner_id=?"], [owner_id]
+    if bucket:
+        cond, extra = status_filter(bucket, today, days)
+        where.append(cond); params += extra
+    if search:
+        if fts:
+            where.append("customers_fts MATCH ?"); params.append(fts_query(search, owner_id))
+        else:
+            where.append("(c.name LIKE ? ESCAPE '\\' OR c.device_info LIKE ? ESCAPE '\\')")
+            params += [_like_pattern(search)] * 2
+    return " AND ".join(where), params
+
+def _customer_from(conn, search):
+    """(FROM ..., dùng FTS?) — FTS chỉ khi có bảng index và ô tìm kiếm có ít nhất 1 từ.
+    CROSS JOIN ép đọc customers_fts trước: để planner tự chọn, COUNT(*) đi theo index owner_id rồi chạy
+    lại MATCH cho từng dòng (100k dòng => vài phút)"""
+    if search and has_fts(conn) and fts_query(search):
+        return "customers_fts CROSS JOIN customers c ON c.id = customers_fts.rowid", True
+    return "customers c", False
+
+def query_customers(conn, owner_id, bucket=None, search=None, limit=None, offset=0, today=None, days=EXPIRING_DAYS):
+    """Khách của 1 owner, lọc ngay trong SQL. Tìm kiếm FTS => sắp theo độ khớp (bm25);
+    có nhóm trạng thái => theo ngày hết hạn, không thì theo tên (đi thẳng theo index, LIMIT/OFFSET không sort cả bảng)."""
+    source, fts = _customer_from(conn, search)
+    where, params = customer_where(owner_id, bucket, search, today, days, fts)
+    order = "expiry_date, c.id" if bucket else "c.name, c.id"
+    if fts: order = "customers_fts.rank, " + order
+    columns = ", ".join(f"c.{col.strip()}" for col in CUSTOMER_COLUMNS.split(","))
+    sql = f"SELECT {columns} FROM {source} WHERE {where} ORDER BY {order}"
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"; params += [limit, offset]
+    return pd.read_sql_query(sql, conn, params=params)
+
+def count_customers(conn, owner_id, bucket=None, search=None, today=None, days=EXPIRING_DAYS):
+    source, fts = _customer_from(conn, search)
+    where, params = customer_where(owner_id, bucket, search, today, days, fts)
+    return conn.execute(f"SELECT COUNT(*) FROM {source} WHERE {where}", params).fetchone()[0]
+
+def customers_expiring(conn, owner_id, within_days=EXPIRING_DAYS, today=None):
+    return query_customers(conn, owner_id, "expiring", today=today, days=within_days)
+
+def customers_expired(conn, owner_id, more_than_days=0, today=None):
+    return query_customers(conn, owner_id, "expired", today=today, days=more_than_days)
+
+def status_counts(conn, owner_id, today=None, days=EXPIRING_DAYS):
+    """Số khách mỗi nhóm, 1 lượt quét index (owner_id, expiry_date) không đọc bảng"""
+    parts, params = [], []
+    for bucket in STATUS_BUCKETS:
+        cond, extra = status_filter(bucket, today, days if bucket != "expired" else 0)
+        parts.append(f"COALESCE(SUM(CASE WHEN {cond} THEN 1 ELSE 0 END), 0)"); params += extra
+    row = conn.execute(f"SELECT {', '.join(parts)} FROM customers WHERE owner_id=?", params + [owner_id]).fetchone()
+    return dict(zip(STATUS_BUCKETS, row))
+
+
+# --- QUÉT HẾT HẠN HẰNG NGÀY & HÀNG ĐỢI THÔNG BÁO ---
+def _state(conn, key):
+    row = conn.execute("SELECT value FROM scheduler_state WHERE key=?", (key,)).fetchone()
+    return row[0] if row else None
+
+def last_expiry_scan(conn):
+    """Ngày quét gần nhất (date) hoặc None nếu chưa quét lần nào"""
+    value = _state(conn, "expiry_scan_date")
+    return date.fromisoformat(value) if value else None
+
+def scan_expiry(conn, today=None, days=EXPIRING_DAYS):
+    """Quét tăng dần theo index expiry_date: chỉ xét khoảng ngày mới vào cửa sổ kể từ lần quét trước.
+    Lần đầu (hoặc đổi N) => quét toàn bộ. Chạy lại trong cùng ngày không làm gì. Trả về số sự kiện mới theo loại."""
+    today = today or date.today()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        last, last_days = last_expiry_scan(conn), _state(conn, "expiring_days")
+        if last is not None and last >= today and last_days == str(days):
+            conn.commit(); return {"expired": 0, "expiring": 0}
+        full = last is None or last_days != str(days) or last > today
+        if full: conn.execute("DELETE FROM expiry_events WHERE notified_at IS NULL")
+        insert = """INSERT OR IGNORE INTO expiry_events (owner_id, customer_id, kind, expiry_date, scan_date)
+                    SELECT owner_id, id, ?, expiry_date, ? FROM customers
+                    WHERE owner_id IS NOT NULL AND expiry_date > ? AND expiry_date <= ?"""
+        lo_expired = "0000-00-00" if full else _iso(last)
+        lo_expiring = _iso(today) if full else _iso(max(today, last + timedelta(days=days + 1)))
+        new = {
+            "expired": conn.execute(insert, ("expired", _iso(today), lo_expired, _iso(today))).rowcount,
+            "expiring": conn.execute(insert, ("expiring", _iso(today), lo_expiring, _iso(today + timedelta(days=days + 1)))).rowcount,
+        }
+        conn.executemany("INSERT OR REPLACE INTO scheduler_state (key, value) VALUES (?, ?)",
+                         [("expiry_scan_date", _iso(today)), ("expiring_days", str(days))])
+        conn.commit()
+        return new
+    except BaseException:
+        conn.rollback(); raise
+
+def status_counts_from_events(conn, owner_id):
+    """Số khách mỗi nhóm đọc từ trạng thái đã tính sẵn của lần quét gần nhất (None nếu chưa quét).
+    expired/expiring đếm trên expiry_events; error đếm qua index; active = phần còn lại."""
+    scan = last_expiry_scan(conn)
+    if scan is None: return None
+    counts = dict(conn.execute("""SELECT e.kind, COUNT(*) FROM expiry_events e
+        JOIN customers c ON c.id = e.customer_id AND c.expiry_date = e.expiry_date
+        WHERE e.owner_id=? AND (e.kind='expired' OR e.expiry_date > ?) GROUP BY e.kind""", (owner_id, _iso(scan))).fetchall())
+    total, error = conn.execute("SELECT COUNT(*), COUNT(*) - COUNT(expiry_date) FROM customers WHERE owner_id=?",
+                                (owner_id,)).fetchone()
+    out = {"expired": counts.get("expired", 0), "expiring": counts.get("expiring", 0), "error": error}
+    out["active"] = total - sum(out.values())
+    return {b: out[b] for b in STATUS_BUCKETS}
+
+def owner_events(conn, owner_id, limit=20):
+    """Sự kiện còn hiệu lực của 1 owner (mới nhất trước) cho ô thông báo trên giao diện"""
+    scan = last_expiry_scan(conn)
+    return pd.read_sql_query("""SELECT e.kind, e.expiry_date, c.name, c.device_info FROM expiry_events e
+        JOIN customers c ON c.id = e.customer_id AND c.expiry_date = e.expiry_date
+        WHERE e.owner_id=? AND (e.kind='expired' AND e.expiry_date > ? OR e.kind='expiring' AND e.expiry_date > ?)
+        ORDER BY e.kind DESC, e.expiry_date LIMIT ?""", conn,
+        params=(owner_id, _iso((scan or date.today()) - timedelta(days=EXPIRING_DAYS + 1)), _iso(scan or date.today()), limit))
+
+def pending_notifications(conn, limit=1000):
+    return conn.execute("""SELECT e.id, e.owner_id, u.username, e.kind, e.expiry_date, c.name, c.device_info
+        FROM expiry_events e JOIN customers c ON c.id = e.customer_id LEFT JOIN users u ON u.id = e.owner_id
+        WHERE e.notified_at IS NULL ORDER BY e.id LIMIT ?""", (limit,)).fetchall()
+
+def mark_notified(conn, event_ids):
+    conn.executemany("UPDATE expiry_events SET notified_at=datetime('now') WHERE id=?", [(i,) for i in event_ids])
+
+def claim_notifications(conn, limit=1000):
+    """Lấy 1 lô sự kiện chờ và đánh dấu đã gửi trong cùng 1 transaction ghi => 2 tiến trình (luồng trong app
+    + daemon CLI) không lấy trùng lô. Gửi lỗi => release_notifications trả lô về hàng đợi"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        events = pending_notifications(conn, limit)
+        mark_notified(conn, [e[0] for e in events])
+        conn.commit()
+        return events
+    except BaseException:
+        conn.rollback(); raise
+
+def release_notifications(conn, event_ids):
+    conn.executemany("UPDATE expiry_events SET notified_at=NULL WHERE id=?", [(i,) for i in event_ids])
+
+
+# --- DOANH THU THEO THÁNG (ROLLUP) ---
+def _revenue_expected_sql(owner_id=None):
+    where = "WHERE owner_id=?" if owner_id is not None else ""
+    return f"""SELECT owner_id, ym, SUM(reg_months), SUM(active_subs)
+        FROM ({_revenue_rows_sql('c', table='customers c')}) {where}
+        GROUP BY owner_id, ym HAVING SUM(reg_months) != 0 OR SUM(active_subs) != 0"""
+
+def rebuild_revenue(conn, owner_id=None):
+    """Tính lại revenue_monthly từ đầu (cả bảng hoặc 1 owner). Trả về số dòng rollup"""
+    params = [owner_id] if owner_id is not None else []
+    conn.execute("DELETE FROM revenue_monthly" + (" WHERE owner_id=?" if params else ""), params)
+    return conn.execute(f"INSERT INTO revenue_monthly (owner_id, ym, reg_months, active_subs) {_revenue_expected_sql(owner_id)}",
+                        params).rowcount
+
+def check_revenue(conn, owner_id=None):
+    """Đối chiếu rollup với dữ liệu gốc. Trả về list (owner_id, ym, đang lưu, đúng) các tháng bị lệch"""
+    params = [owner_id] if owner_id is not None else []
+    stored = {(r[0], r[1]): (r[2], r[3]) for r in conn.execute(
+        "SELECT owner_id, ym, reg_months, active_subs FROM revenue_monthly" + (" WHERE owner_id=?" if params else ""), params)}
+    expected = {(r[0], r[1]): (r[2], r[3]) for r in conn.execute(_revenue_expected_sql(owner_id), params)}
+    return [(o, ym, stored.get((o, ym)), expected.get((o, ym)))
+            for o, ym in sorted(stored.keys() | expected.keys()) if stored.get((o, ym)) != expected.get((o, ym))]
+
+def monthly_revenue(conn, owner_id):
+    """Rollup của 1 owner: DataFrame ym, reg_months, active_subs (đọc theo khóa chính, không quét customers)"""
+    return pd.read_sql_query("SELECT ym, reg_months, active_subs FROM revenue_monthly WHERE owner_id=? ORDER BY ym",
+                             conn, params=(owner_id,))
+
+
+if __name__ == "__main__":
+    # Nâng cấp file DB tại chỗ:  python member_db.py dulieu_game.db [--claim-owner USER_ID]
+    import argparse
+    ap = argparse.ArgumentParser(description="Nâng cấp schema CSDL khách hàng")
+    ap.add_argument("db_file")
+    ap.add_argument("--claim-owner", type=int, help="Gán khách chưa có owner_id cho tài khoản này")
+    ap.add_argument("--check-revenue", action="store_true", help="Đối chiếu bảng doanh thu theo tháng với dữ liệu gốc")
+    ap.add_argument("--rebuild-revenue", action="store_true", help="Tính lại bảng doanh thu theo tháng từ đầu")
+    args = ap.parse_args()
+    pool = ConnectionPool(args.db_file, max_size=1)
+    with pool.connection() as conn:
+        before = schema_version(conn)
+        applied = migrate(conn)
+        print(f"Schema v{before} -> v{schema_version(conn)} (đã chạy: {applied or 'không có'})")
+        if args.claim_owner is not None:
+            print(f"Đã gán {claim_orphans(conn, args.claim_owner)} khách cho owner_id={args.claim_owner}")
+        if args.check_revenue:
+            diff = check_revenue(conn)
+            for owner_id, ym, stored, expected in diff[:20]:
+                print(f"  owner_id={owner_id} {ym}: đang lưu {stored} != đúng {expected}")
+            print(f"Doanh thu: {len(diff)} tháng bị lệch" if diff else "Doanh thu: khớp")
+        if args.rebuild_revenue:
+            print(f"Đã tính lại {rebuild_revenue(conn)} dòng doanh thu")
+    pool.close()
@@ -0,0 +1,110 @@
+import glob
+import gzip
+import os
+import tempfile
+import time
+import pandas as pd
+from member_db import CUSTOMER_COLUMNS
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:   # Parquet/Arrow là tùy chọn: pip install pyarrow
+    pa = None
+
+# --- XUẤT DỮ LIỆU THEO LUỒNG (STREAMING EXPORT) ---
+# Chỉ tạo tệp khi người dùng bấm nút. Dữ liệu đọc từ cursor SQL theo lô CHUNK_ROWS dòng và ghi
+# thẳng ra tệp tạm (gzip nếu chọn) => bộ nhớ chỉ giữ 1 lô, không giữ cả bảng + 3 chuỗi bytes như trước.
+
+CHUNK_ROWS = 50000
+EXPORT_PREFIX = "member_export_"
+# Tệp xuất cũ hơn mức này bị dọn ở lần xuất kế tiếp (của bất kỳ phiên nào): phiên đóng tab/hết hạn
+# không còn ai xóa tệp của nó
+EXPORT_MAX_AGE = 30 * 60
+
+# key -> (nhãn, đuôi tệp, MIME, cần pyarrow?)
+EXPORT_FORMATS = {
+    "csv": ("CSV (Excel)", "csv", "text/csv", False),
+    "json": ("JSON", "json", "application/json", False),
+    "txt": ("TXT (tab)", "txt", "text/plain", False),
+    "parquet": ("Parquet", "parquet", "application/vnd.apache.parquet", True),
+    "arrow": ("Arrow IPC", "arrow", "application/vnd.apache.arrow.file", True),
+}
+
+def available_formats():
+    return [k for k, v in EXPORT_FORMATS.items() if pa is not None or not v[3]]
+
+def iter_customer_chunks(conn, owner_id, chunk_size=CHUNK_ROWS):
+    """Khách của 1 owner, từng lô DataFrame đọc dần từ cursor (cùng cột với get_all_customers)"""
+    yield from pd.read_sql_query(f"SELECT {CUSTOMER_COLUMNS} FROM customers WHERE owner_id=? ORDER BY id",
+                                 conn, params=(owner_id,), chunksize=chunk_size)
+
+def iter_frame_chunks(df, chunk_size=CHUNK_ROWS):
+    for i in range(0, len(df), chunk_size):
+        yield df.iloc[i:i + chunk_size]
+
+def _write_text(frames, fmt, out):
+    """CSV/TXT: tiêu đề 1 lần rồi nối các lô; JSON: mảng records ghép từ các lô"""
+    rows, first = 0, True
+    if fmt == "json": out.write(b"[")
+    for df in frames:
+        if df.empty: continue
+        if fmt == "json":
+            body = df.to_json(orient="records", force_ascii=False)[1:-1]
+            out.write((body if first else "," + body).encode("utf-8"))
+        else:
+            out.write(df.to_csv(index=False, header=first, sep="," if fmt == "csv" else "\t").encode("utf-8"))
+        rows += len(df); first = False
+    if fmt == "json": out.write(b"]")
+    return rows
+
+def _arrow_schema(columns):
+    # Schema cố định: lô đầu toàn NULL không được làm cột thành kiểu null rồi vỡ ở lô sau
+    ints = {"id", "owner_id", "duration"}
+    return pa.schema([(c, pa.int64() if c in ints else pa.string()) for c in columns])
+
+def _write_arrow(frames, fmt, out):
+    rows, writer, schema = 0, None, None
+    try:
+        for df in frames:
+            if schema is None: schema = _arrow_schema(df.columns)
+            table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(out, schema) if fmt == "parquet" else pa.ipc.new_file(out, schema)
+            writer.write_table(table); rows += len(df)
+    finally:
+        if writer is not None: writer.close()
+    return rows
+
+def export_to_file(frames, fmt, compress=False):
+    """Ghi các lô ra tệp tạm. Trả về (đường dẫn, số dòng, số byte); người gọi xóa tệp khi xong"""
+    if fmt not in available_formats(): raise ValueError(f"Định dạng không hỗ trợ: {fmt}")
+    ext = EXPORT_FORMATS[fmt][1] + (".gz" if compress else "")
+    fd, path = tempfile.mkstemp(prefix=EXPORT_PREFIX, suffix="." + ext)
+    try:
+        with os.fdopen(fd, "wb") as raw:
+            out = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) if compress else raw
+            try: rows = _write_arrow(frames, fmt, out) if EXPORT_FORMATS[fmt][3] else _write_text(frames, fmt, out)
+            finally:
+                if compress: out.close()
+    except BaseException:
+        os.remove(path); raise
+    return path, rows, os.path.getsize(path)
+
+def sweep_exports(max_age=EXPORT_MAX_AGE, now=None):
+    """Xóa tệp xuất tạm (member_export_*) sửa lần cuối quá max_age giây; trả về số tệp đã xóa"""
+    now = now or time.time()
+    removed = 0
+    for path in glob.glob(os.path.join(tempfile.gettempdir(), EXPORT_PREFIX + "*")):
+        try:
+            if now - os.path.getmtime(path) > max_age:
+                os.remove(path); removed += 1
+        except OSError: pass   # phiên khác vừa xóa / đang ghi
+    return removed
+
+def export_filename(fmt, compress=False):
+    return "data." + EXPORT_FORMATS[fmt][1] + (".gz" if compress else "")
+
+def export_mime(fmt, compress=False):
+    return "application/gzip" if compress else EXPORT_FORMATS[fmt][2]
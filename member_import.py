@@ -0,0 +1,167 @@
+import ast
+import csv
+import io
+import json
+from datetime import datetime
+import pandas as pd
+
+# --- NHẬP DỮ LIỆU THEO LUỒNG (STREAMING IMPORT) ---
+# Định dạng, dấu phân cách, dòng tiêu đề và ánh xạ cột chỉ đoán từ 1 đoạn đầu tệp (SNIFF_BYTES).
+# Phần còn lại đọc từng lô CHUNK_ROWS dòng: CSV qua engine C của pandas, JSON Lines theo dòng,
+# mảng JSON giải mã dần từng phần tử => bộ nhớ tăng theo kích thước lô, không theo kích thước tệp.
+
+SNIFF_BYTES = 64 * 1024
+CHUNK_ROWS = 20000
+READ_BYTES = 1 << 20
+WHOLE_DOC_LIMIT = 16 * 1024 * 1024   # JSON không đọc dần được (dict theo cột, cú pháp Python) => đọc cả, tối đa 16 MB
+DELIMITERS = ",;\t|"
+
+
+class ImportFormatError(ValueError):
+    """Tệp nhập không đọc được"""
+
+
+def column_map(columns):
+    """Heuristic của smart_import: tên cột (đã lower/strip) -> cột name/device/date/duration"""
+    col_map = {'name': '', 'device': '', 'date': '', 'duration': ''}
+    for col in columns:
+        if any(x in col for x in ['ten', 'name', 'khach']): col_map['name'] = col
+        elif any(x in col for x in ['thiet', 'device', 'thông tin']): col_map['device'] = col
+        elif any(x in col for x in ['ngay', 'date']): col_map['date'] = col
+        elif any(x in col for x in ['thang', 'duration']): col_map['duration'] = col
+    return col_map
+
+def smart_import(df_raw, col_map=None):
+    """Bảng nhập thô -> đúng 4 cột name, device_info, reg_date, duration. col_map=None => đoán từ tên cột"""
+    df_raw.columns = [str(c).lower().strip() for c in df_raw.columns]
+    if col_map is None: col_map = column_map(df_raw.columns)
+    today = datetime.now().strftime("%d/%m/%Y")
+
+    df_clean = pd.DataFrame(index=df_raw.index)
+    df_clean['name'] = df_raw[col_map['name']] if col_map['name'] else "Khách Nhập"
+    df_clean['device_info'] = df_raw[col_map['device']] if col_map['device'] else ""
+    df_clean['reg_date'] = df_raw[col_map['date']].fillna(today) if col_map['date'] else today
+    df_clean['duration'] = pd.to_numeric(df_raw[col_map['duration']], errors='coerce').fillna(1).astype(int) if col_map['duration'] else 1
+    return df_clean
+
+def _is_number(value):
+    try: float(value); return True
+    except ValueError: return False
+
+def sniff_csv(sample):
+    """(dấu phân cách, có dòng tiêu đề?) từ đoạn đầu tệp.
+    Tiêu đề giống bản cũ: dòng đầu không có ô nào là số."""
+    lines = sample.splitlines()
+    head = "\n".join(lines[:-1] if len(lines) > 1 else lines)   # bỏ dòng cuối có thể bị cắt dở
+    try: sep = csv.Sniffer().sniff(head, delimiters=DELIMITERS).delimiter
+    except csv.Error: sep = max(DELIMITERS, key=lambda d: lines[0].count(d) if lines else 0)
+    first = next(csv.reader(io.StringIO(head), delimiter=sep), [])
+    has_header = bool(first) and not any(_is_number(v.strip()) for v in first if v.strip())
+    return sep, has_header
+
+def _iter_json_array(text, chunk_rows):
+    """Giải mã dần mảng JSON [{...}, {...}] từ luồng văn bản, trả từng lô list dict"""
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+
+    def fill():
+        nonlocal buf, pos, eof
+        data = text.read(READ_BYTES)
+        if not data: eof = True
+        buf = buf[pos:] + data; pos = 0
+
+    def skip_ws():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos].isspace(): pos += 1
+            if pos < len(buf) or eof: return
+            fill()
+
+    skip_ws()
+    if buf[pos:pos + 1] != "[": raise ImportFormatError("Không phải mảng JSON")
+    pos += 1
+    batch = []
+    skip_ws()
+    if buf[pos:pos + 1] == "]": return
+    while True:
+        while True:
+            try:
+                obj, pos = decoder.raw_decode(buf, pos); break
+            except json.JSONDecodeError:
+                if eof: raise ImportFormatError("Mảng JSON lỗi hoặc bị cắt dở")
+                fill()
+        batch.append(obj)
+        if len(batch) >= chunk_rows: yield batch; batch = []
+        skip_ws()
+        sep = buf[pos:pos + 1]; pos += 1
+        if sep == "]": break
+        if not sep: raise ImportFormatError("Mảng JSON bị cắt dở")
+        if sep != ",": raise ImportFormatError("Mảng JSON lỗi: thiếu dấu phẩy")
+        skip_ws()
+    if batch: yield batch
+
+def _is_json_record(line):
+    """Dòng đầu là 1 object JSON trọn vẹn, giá trị đều là scalar => JSON Lines (không phải dict theo cột)"""
+    try: obj = json.loads(line)
+    except json.JSONDecodeError: return False
+    return isinstance(obj, dict) and not any(isinstance(v, (list, dict)) for v in obj.values())
+
+def _iter_json_lines(text, first_line, chunk_rows):
+    batch = [json.loads(first_line)]
+    for line in text:
+        if not line.strip(): continue
+        try: batch.append(json.loads(line))
+        except json.JSONDecodeError as e: raise ImportFormatError(f"JSON Lines lỗi: {e}")
+        if len(batch) >= chunk_rows: yield batch; batch = []
+    if batch: yield batch
+
+def _whole_document(text):
+    """Dạng không đọc dần được: dict theo cột hoặc cú pháp Python (bản cũ dùng ast.literal_eval)"""
+    content = text.read(WHOLE_DOC_LIMIT + 1)
+    if len(content) > WHOLE_DOC_LIMIT:
+        raise ImportFormatError("Tệp JSON lớn phải là mảng [{...}] hoặc JSON Lines (mỗi dòng 1 object)")
+    try: data = json.loads(content)
+    except json.JSONDecodeError:
+        try: data = ast.literal_eval(content.strip())
+        except (ValueError, SyntaxError) as e: raise ImportFormatError(f"Không đọc được JSON: {e}")
+    try: return pd.DataFrame(data)
+    except ValueError: return pd.DataFrame([data])
+
+def iter_import_frames(text, chunk_rows=CHUNK_ROWS):
+    """Luồng văn bản (tệp tải lên hoặc văn bản dán) -> các lô DataFrame đã qua smart_import.
+    Ánh xạ cột đoán 1 lần từ lô đầu và dùng lại cho mọi lô sau."""
+    sample = text.read(SNIFF_BYTES)
+    text.seek(0)
+    head = sample.lstrip()
+    if not head: return
+
+    if head[0] in "[{":
+        col_map, columns = None, None
+        if head[0] == "[":
+            batches = (pd.DataFrame(b) for b in _iter_json_array(text, chunk_rows))
+        elif _is_json_record(head.splitlines()[0]):
+            first_line = text.readline()
+            while not first_line.strip(): first_line = text.readline()
+            batches = (pd.DataFrame(b) for b in _iter_json_lines(text, first_line, chunk_rows))
+        else:
+            batches = iter([_whole_document(text)])
+        try:
+            for df in batches:
+                df.columns = [str(c).lower().strip() for c in df.columns]
+                if col_map is None: col_map, columns = column_map(df.columns), list(df.columns)
+                else: df = df.reindex(columns=columns)
+                yield smart_import(df, col_map)
+        except ImportFormatError:
+            # Mảng cú pháp Python ([{'a': 1}]) => thử đọc cả tài liệu như bản cũ
+            if col_map is not None or head[0] != "[": raise
+            text.seek(0); yield smart_import(_whole_document(text))
+        return
+
+    sep, has_header = sniff_csv(sample)
+    reader = pd.read_csv(text, sep=sep, header=0 if has_header else None, dtype=str, engine="c",
+                         chunksize=chunk_rows, skipinitialspace=True)
+    col_map = None
+    for df in reader:
+        df.columns = [str(c).lower().strip() for c in df.columns]
+        if col_map is None: col_map = column_map(df.columns)
+        yield smart_import(df, col_map)
@@ -0,0 +1,136 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from member_auth import LatencyStats
+
+# --- ĐO HIỆU NĂNG TỪNG LƯỢT RERUN (BẬT KHI CẦN) ---
+# Mỗi lượt chạy script Streamlit = 1 RerunProfile: thời gian từng giai đoạn có tên (stage), số câu SQL
+# đã chạy (qua trace callback của sqlite3, gắn vào ConnectionPool.trace), số dòng đã đọc, RAM của các
+# DataFrame chính. Hết lượt => 1 dòng JSON nối vào profile.jsonl + cộng vào p50/p95/p99 theo stage.
+# Tắt (mặc định) => mọi hàm chỉ kiểm tra 1 thuộc tính rồi trả về, không đo gì.
+# Bật: biến môi trường MEMBER_PROFILE=1 hoặc app_settings.profiling = '1'.
+# So sánh giữa các bản phát hành (MEMBER_RELEASE ghi vào từng dòng log):
+#   python member_profile.py profile.jsonl [profile_cu.jsonl ...] [--stage editor_page]
+
+PROFILE_LOG = "profile.jsonl"
+
+
+class RerunProfile:
+    """Số đo của 1 lượt rerun; stage gọi nhiều lần được cộng dồn, stage lồng nhau tính riêng từng stage"""
+
+    def __init__(self, **meta):
+        self.meta = meta
+        self.started = time.perf_counter()
+        self.stages = {}   # tên -> giây
+        self.sql = 0
+        self.rows = 0
+        self.frames = {}   # tên -> byte
+
+    def to_dict(self, total):
+        return {**self.meta, "ts": datetime.now().isoformat(timespec="seconds"), "total_ms": round(total * 1000, 3),
+                "stages": {k: round(v * 1000, 3) for k, v in self.stages.items()},
+                "sql": self.sql, "rows": self.rows, "frames": self.frames}
+
+
+class Profiler:
+    """Dùng chung 1 tiến trình; lượt đang đo giữ theo luồng (mỗi phiên Streamlit chạy script trong luồng riêng)"""
+
+    def __init__(self, enabled=False, log_path=PROFILE_LOG, release=None, window=1000, history=50):
+        self.enabled = enabled
+        self.log_path = log_path
+        self.release = release or os.environ.get("MEMBER_RELEASE", "dev")
+        self.stats = LatencyStats(window)
+        self.history = history
+        self._recent = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def current(self):
+        return getattr(self._local, "profile", None)
+
+    def begin(self, **meta):
+        if self.enabled: self._local.profile = RerunProfile(release=self.release, **meta)
+
+    def end(self, **meta):
+        """Kết thúc lượt đang đo: ghi log + cộng vào thống kê, trả về dict của lượt (None nếu không đo)"""
+        prof = self.current
+        if prof is None: return None
+        self._local.profile = None
+        prof.meta.update(meta)
+        total = time.perf_counter() - prof.started
+        self.stats.record("rerun", total)
+        for name, seconds in prof.stages.items(): self.stats.record(name, seconds)
+        record = prof.to_dict(total)
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._recent = (self._recent + [record])[-self.history:]
+            if self.log_path:
+                with open(self.log_path, "a", encoding="utf-8") as f: f.write(line + "\n")
+        return record
+
+    @contextmanager
+    def stage(self, name):
+        prof = self.current
+        if prof is None:
+            yield; return
+        start = time.perf_counter()
+        try: yield
+        finally: prof.stages[name] = prof.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def trace(self, statement):
+        # Gắn vào sqlite3 set_trace_callback: chạy ở luồng thực thi câu lệnh => luồng nền (bộ quét) không bị tính
+        prof = self.current
+        if prof is not None: prof.sql += 1
+
+    def add_rows(self, n):
+        prof = self.current
+        if prof is not None: prof.rows += int(n)
+
+    def frame(self, name, df):
+        """RAM (deep) của 1 DataFrame; chỉ tính khi đang đo vì deep=True phải duyệt từng chuỗi"""
+        prof = self.current
+        if prof is not None and df is not None:
+            prof.frames[name] = int(df.memory_usage(index=True, deep=True).sum())
+
+    def recent(self):
+        with self._lock: return list(self._recent)
+
+
+# --- BÁO CÁO TỔNG HỢP TỪ LOG ---
+def load_log(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def aggregate(records):
+    """{release: LatencyStats} gồm stage 'rerun' (tổng lượt) và từng stage; kèm sql/rows trung bình"""
+    out = {}
+    for rec in records:
+        rel = out.setdefault(rec.get("release", "dev"), {"stats": LatencyStats(window=None), "sql": 0, "rows": 0, "n": 0})
+        rel["stats"].record("rerun", rec["total_ms"] / 1000)
+        for name, ms in rec["stages"].items(): rel["stats"].record(name, ms / 1000)
+        rel["sql"] += rec["sql"]; rel["rows"] += rec["rows"]; rel["n"] += 1
+    return out
+
+def report(records, stage=None):
+    lines = [f"{'release':<12} {'stage':<20} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}"]
+    for release, rel in aggregate(records).items():
+        stats = rel["stats"]
+        for name in sorted(stats.names(), key=lambda s: (s != "rerun", s)):
+            if stage and name not in (stage, "rerun"): continue
+            m = stats.summary(name)
+            lines.append(f"{release:<12} {name:<20} {m['count']:>6} {m['p50_ms']:>9.1f} {m['p95_ms']:>9.1f} {m['p99_ms']:>9.1f} {m['max_ms']:>9.1f}")
+        lines.append(f"{release:<12} {'(SQL/dòng đọc TB)':<20} {rel['n']:>6} {rel['sql'] / rel['n']:>9.1f} {rel['rows'] / rel['n']:>9.0f}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Tổng hợp p50/p95/p99 theo stage từ log profile (JSON Lines)")
+    ap.add_argument("logs", nargs="+", help="1 hoặc nhiều tệp log (vd. mỗi bản phát hành 1 tệp)")
+    ap.add_argument("--stage", help="Chỉ in stage này (kèm rerun)")
+    args = ap.parse_args()
+    print(report([rec for path in args.logs for rec in load_log(path)], args.stage))
@@ -0,0 +1,109 @@
+import json
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from member_db import ConnectionPool, EXPIRING_DAYS, claim_notifications, migrate, release_notifications, scan_expiry
+
+# --- BỘ QUÉT HẾT HẠN CHẠY NỀN ---
+# Mỗi ngày 1 lần: scan_expiry() ghi sự kiện "sắp hết"/"đã hết" vào expiry_events, rồi đẩy các sự kiện
+# chưa gửi ra nơi nhận thông báo (mặc định: tệp JSON Lines, thay cho SMTP).
+# Chạy trong tiến trình Streamlit (get_scheduler() qua st.cache_resource) hoặc độc lập:
+#   python member_scheduler.py dulieu_game_v2.db [--once] [--outbox notifications.jsonl]
+# Nhiều tiến trình cùng chạy vẫn an toàn: scan_expiry giữ khóa ghi và bỏ qua nếu hôm nay đã quét; mỗi lô
+# thông báo được nhận (đánh dấu đã gửi) trong 1 transaction ghi trước khi gửi => không tiến trình nào gửi trùng.
+# Gửi lỗi => lô được trả lại hàng đợi; tiến trình chết giữa lúc nhận và gửi => lô đó mất (gửi tối đa 1 lần).
+
+OUTBOX_FILE = "notifications.jsonl"
+
+
+class FileNotifier:
+    """Nơi nhận thông báo: mỗi sự kiện 1 dòng JSON nối vào tệp"""
+
+    def __init__(self, path=OUTBOX_FILE):
+        self.path = path
+
+    def send(self, events):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for event_id, owner_id, username, kind, expiry_date, name, device in events:
+                f.write(json.dumps({"event_id": event_id, "owner_id": owner_id, "username": username, "kind": kind,
+                                    "expiry_date": expiry_date, "name": name, "device_info": device,
+                                    "sent_at": datetime.now().isoformat(timespec="seconds")}, ensure_ascii=False) + "\n")
+
+
+def run_once(pool, notifier=None, today=None, days=EXPIRING_DAYS, batch=1000):
+    """1 lượt: quét + gửi thông báo đang chờ. Trả về thống kê"""
+    with pool.connection() as conn:
+        new = scan_expiry(conn, today, days)
+    sent = 0
+    if notifier is not None:
+        while True:
+            with pool.connection() as conn: events = claim_notifications(conn, batch)
+            if not events: break
+            try: notifier.send(events)
+            except BaseException:
+                with pool.connection() as conn: release_notifications(conn, [e[0] for e in events])
+                raise
+            sent += len(events)
+    return {"new": new, "sent": sent}
+
+
+def seconds_until_next_run(now=None, at_hour=0, at_minute=5):
+    now = now or datetime.now()
+    nxt = now.replace(hour=at_hour, minute=at_minute, second=0, microsecond=0)
+    if nxt <= now: nxt += timedelta(days=1)
+    return (nxt - now).total_seconds()
+
+
+class ExpiryScheduler(threading.Thread):
+    """Luồng nền: chạy run_once ngay khi khởi động rồi mỗi ngày sau nửa đêm"""
+
+    def __init__(self, pool, notifier=None, days=EXPIRING_DAYS, retry_seconds=300):
+        super().__init__(name="expiry-scheduler", daemon=True)
+        self.pool = pool
+        self.notifier = notifier
+        self.days = days
+        self.retry_seconds = retry_seconds
+        self._stop_event = threading.Event()
+        self.last_run = None
+        self.last_result = None
+        self.last_error = None
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.last_result = run_once(self.pool, self.notifier, days=self.days)
+                self.last_run, self.last_error = datetime.now(), None
+                wait = seconds_until_next_run()
+            except Exception as e:   # DB bận/khóa... => thử lại sau, không làm chết luồng
+                self.last_error = e
+                wait = self.retry_seconds
+            self._stop_event.wait(wait)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def stats(self):
+        return {"alive": self.is_alive(), "last_run": self.last_run, "last_result": self.last_result,
+                "last_error": self.last_error}
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Quét khách sắp hết/đã hết hạn và ghi hàng đợi thông báo")
+    ap.add_argument("db_file")
+    ap.add_argument("--once", action="store_true", help="Chạy 1 lượt rồi thoát (dùng với cron)")
+    ap.add_argument("--outbox", default=OUTBOX_FILE, help="Tệp JSON Lines nhận thông báo")
+    ap.add_argument("--days", type=int, default=EXPIRING_DAYS, help="Cửa sổ 'sắp hết hạn' (ngày)")
+    ap.add_argument("--date", type=date.fromisoformat, help="Giả lập ngày quét (YYYY-MM-DD)")
+    args = ap.parse_args()
+    pool = ConnectionPool(args.db_file, max_size=2)
+    with pool.connection() as conn: migrate(conn)
+    notifier = FileNotifier(os.path.abspath(args.outbox))
+    if args.once or args.date:
+        print(run_once(pool, notifier, args.date, args.days))
+    else:
+        while True:
+            print(datetime.now().isoformat(timespec="seconds"), run_once(pool, notifier, days=args.days), flush=True)
+            time.sleep(seconds_until_next_run())
+    pool.close()
@@ -0,0 +1,337 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from member_dates import DATE_FMT, parse_date, parse_dates
+
+# --- KHO DỮ LIỆU CHẾ ĐỘ KHÁCH DẠNG CỘT, GỌN RAM ---
+# Trước đây mỗi phiên khách giữ 1 DataFrame object-dtype trong session_state, mỗi lần thêm/xóa lại
+# pd.concat / lọc ra bản sao mới. GuestStore giữ từng cột trong mảng numpy có dư chỗ (append khấu hao O(1)):
+#   name, device_info : mã int32 trỏ vào từ điển chuỗi (mỗi chuỗi khác nhau chỉ lưu 1 lần)
+#   reg_date          : số ngày kể từ 1970-01-01 (int32); chuỗi không đọc được giữ nguyên theo id
+#   duration          : int32
+# Xóa = đánh dấu (tombstone), dồn mảng khi quá nửa số ô đã xóa. frame() dựng DataFrame cùng cột như cũ
+# (id, name, device_info, reg_date, duration), cache tới lần sửa kế tiếp; chuỗi dùng chung với từ điển.
+# GuestRegistry (1 / tiến trình) giữ kho của mọi phiên: giới hạn RAM mỗi phiên + tổng, bỏ phiên nhàn rỗi.
+
+NO_DATE = np.iinfo(np.int32).min
+SMALL_BATCH = 32   # lô nhỏ (thêm/sửa từng dòng trên giao diện) => vòng lặp Python nhanh hơn qua pandas
+EPOCH = np.datetime64("1970-01-01", "D")
+COLUMNS = ["id", "name", "device_info", "reg_date", "duration"]
+
+
+class GuestQuotaError(ValueError):
+    """Dữ liệu khách vượt giới hạn RAM/số dòng của 1 phiên"""
+
+
+class _Dictionary:
+    """Mã hóa chuỗi -> int32, chỉ thêm; truncate() để hoàn tác lần thêm dở"""
+
+    def __init__(self):
+        self.values = []
+        self._index = {}
+        self.nbytes = 0
+
+    def _code(self, value):
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.values)
+            self.values.append(value)
+            self.nbytes += sys.getsizeof(value) + 100   # + ô dict/list
+        return code
+
+    def encode(self, values):
+        if len(values) <= SMALL_BATCH:
+            return np.array([self._code("" if v is None or pd.isna(v) else str(v)) for v in list(values)], dtype=np.int32)
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object).fillna("").astype(str), sort=False)
+        return np.array([self._code(v) for v in uniques.tolist()], dtype=np.int32)[codes]
+
+    def decode(self, codes):
+        return np.asarray(self.values, dtype=object)[codes] if len(codes) else np.empty(0, dtype=object)
+
+    def truncate(self, size):
+        for value in self.values[size:]:
+            del self._index[value]
+            self.nbytes -= sys.getsizeof(value) + 100
+        del self.values[size:]
+
+
+class GuestStore:
+    """Bảng khách của 1 phiên khách, lưu theo cột; id tăng dần theo thứ tự thêm => tìm theo id bằng searchsorted"""
+
+    def __init__(self, max_rows=None, max_bytes=None, capacity=64):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self._id = np.empty(capacity, dtype=np.int64)
+        self._name = np.empty(capacity, dtype=np.int32)
+        self._device = np.empty(capacity, dtype=np.int32)
+        self._day = np.empty(capacity, dtype=np.int32)
+        self._duration = np.empty(capacity, dtype=np.int32)
+        self._alive = np.empty(capacity, dtype=bool)
+        self._n = 0          # số ô đã dùng (kể cả ô đã xóa)
+        self._dead = 0
+        self._names = _Dictionary()
+        self._devices = _Dictionary()
+        self._bad_dates = {}  # id -> chuỗi ngày gốc không đọc được
+        self._frame = None
+        self.version = 0
+        self._bytes = 0
+        self.on_resize = None   # callback(delta) của GuestRegistry: cộng dồn tổng RAM mà không đo lại từng kho
+        self._measure()
+
+    def __len__(self):
+        return self._n - self._dead
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+    def _columns(self):
+        return (self._id, self._name, self._device, self._day, self._duration, self._alive)
+
+    def _resize(self, cap):
+        self._id, self._name, self._device, self._day, self._duration, self._alive = (
+            np.concatenate([col[:self._n], np.empty(cap - self._n, dtype=col.dtype)]) for col in self._columns())
+
+    def _reserve(self, extra):
+        need = self._n + extra
+        if need > len(self._id): self._resize(max(need, len(self._id) * 2))
+
+    def _changed(self):
+        self._frame = None
+        self.version += 1
+        self._measure()
+
+    def _measure(self):
+        """Đo lại RAM ước tính: mảng (cả phần dư) + từ điển chuỗi + DataFrame đang cache (nông, chuỗi dùng chung).
+        Chỉ chạy khi kho đổi (ghi, dựng frame); nbytes() đọc số đã đo"""
+        arrays = sum(col.nbytes for col in self._columns())
+        frame = int(self._frame.memory_usage(index=True, deep=False).sum()) if self._frame is not None else 0
+        bad = sum(sys.getsizeof(v) + 100 for v in self._bad_dates.values())
+        size = arrays + self._names.nbytes + self._devices.nbytes + bad + frame
+        delta, self._bytes = size - self._bytes, size
+        callback = self.on_resize
+        if delta and callback is not None: callback(delta)
+
+    def nbytes(self):
+        return self._bytes
+
+    @staticmethod
+    def _days(values):
+        if len(values) <= SMALL_BATCH:
+            parsed = [parse_date(v) if v is not None and not pd.isna(v) else None for v in list(values)]
+            ok = np.array([d is not None for d in parsed], dtype=bool)
+            days = [(np.datetime64(d.date(), "D") - EPOCH).astype(np.int64) if d else NO_DATE for d in parsed]
+            return np.array(days, dtype=np.int32), ok
+        parsed = parse_dates(pd.Series(values, dtype=object).fillna("").astype(str))
+        days = parsed.to_numpy("datetime64[D]")
+        ok = ~np.isnat(days)
+        out = np.full(len(days), NO_DATE, dtype=np.int32)
+        out[ok] = (days[ok] - EPOCH).astype(np.int64)
+        return out, ok
+
+    def _check_quota(self):
+        if self.max_rows is not None and len(self) > self.max_rows:
+            return f"tối đa {self.max_rows:,} khách/phiên khách"
+        if self.max_bytes is not None and self.nbytes() > self.max_bytes:
+            return f"tối đa {self.max_bytes / 1048576:,.0f} MB/phiên khách"
+        return None
+
+    def append(self, df, base_id=None):
+        """Thêm các dòng (cột name, device_info, reg_date, duration), cấp id liên tiếp. Trả về mảng id.
+        Vượt giới hạn => hoàn tác cả lô và báo GuestQuotaError"""
+        k = len(df)
+        if k == 0: return np.empty(0, dtype=np.int64)
+        last = int(self._id[self._n - 1]) + 1 if self._n else 0
+        start = max(base_id if base_id is not None else int(time.time()), last)
+        n0, cap0, names0, devices0 = self._n, len(self._id), len(self._names.values), len(self._devices.values)
+        self._reserve(k)
+        sl = slice(n0, n0 + k)
+        ids = np.arange(start, start + k, dtype=np.int64)
+        days, ok = self._days(df['reg_date'])
+        self._id[sl] = ids
+        self._name[sl] = self._names.encode(df['name'])
+        self._device[sl] = self._devices.encode(df['device_info'])
+        self._day[sl] = days
+        self._duration[sl] = pd.to_numeric(df['duration'], errors='coerce').fillna(1).to_numpy(np.int32)
+        self._alive[sl] = True
+        raw = pd.Series(df['reg_date'], dtype=object).to_numpy()
+        for i in np.flatnonzero(~ok).tolist():
+            if raw[i] is not None and not pd.isna(raw[i]) and str(raw[i]).strip(): self._bad_dates[int(ids[i])] = str(raw[i])
+        self._n += k
+        self._changed()
+        err = self._check_quota()
+        if err:
+            for i in ids[~ok].tolist(): self._bad_dates.pop(i, None)
+            self._n = n0
+            if len(self._id) > cap0: self._resize(cap0)
+            self._names.truncate(names0); self._devices.truncate(devices0)
+            self._changed()
+            raise GuestQuotaError(f"Vượt giới hạn dữ liệu chế độ khách ({err}). Hãy đăng nhập để lưu nhiều hơn.")
+        return ids
+
+    def _slots(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        pos = np.searchsorted(self._id[:self._n], ids)
+        pos = np.minimum(pos, max(self._n - 1, 0))
+        hit = (self._n > 0) & (self._id[pos] == ids) & self._alive[pos]
+        return pos, hit
+
+    def update(self, rows):
+        """rows: [(name, device_info, reg_date, duration, id)] như apply_customer_changes. Trả về số dòng đã sửa"""
+        if not rows or not self._n: return 0
+        upd = pd.DataFrame(rows, columns=["name", "device_info", "reg_date", "duration", "id"])
+        pos, hit = self._slots(upd['id'])
+        if not hit.any(): return 0
+        upd, pos = upd[hit], pos[hit]
+        days, ok = self._days(upd['reg_date'])
+        self._name[pos] = self._names.encode(upd['name'])
+        self._device[pos] = self._devices.encode(upd['device_info'])
+        self._day[pos] = days
+        self._duration[pos] = pd.to_numeric(upd['duration'], errors='coerce').fillna(1).to_numpy(np.int32)
+        for i, (cid, raw) in enumerate(zip(upd['id'].tolist(), upd['reg_date'].tolist())):
+            if ok[i] or not str(raw or "").strip(): self._bad_dates.pop(cid, None)
+            else: self._bad_dates[cid] = str(raw)
+        self._changed()
+        return int(hit.sum())
+
+    def delete(self, ids):
+        pos, hit = self._slots(list(ids))
+        pos = np.unique(pos[hit])
+        if not len(pos): return 0
+        self._alive[pos] = False
+        self._dead += len(pos)
+        for cid in self._id[pos].tolist(): self._bad_dates.pop(cid, None)
+        if self._dead > 1024 and self._dead * 2 > self._n: self._compact()
+        self._changed()
+        return len(pos)
+
+    def _compact(self):
+        """Dồn các ô còn sống lên đầu, dựng lại từ điển (bỏ chuỗi không còn dùng), co mảng về vừa đủ"""
+        keep = np.flatnonzero(self._alive[:self._n])
+        names, devices = self._names.decode(self._name[keep]), self._devices.decode(self._device[keep])
+        self._names, self._devices = _Dictionary(), _Dictionary()
+        cap = max(64, len(keep) + len(keep) // 4)
+        for attr in ("_id", "_day", "_duration"):
+            col = getattr(self, attr)
+            setattr(self, attr, np.concatenate([col[keep], np.empty(cap - len(keep), dtype=col.dtype)]))
+        self._name = np.concatenate([self._names.encode(names), np.empty(cap - len(keep), dtype=np.int32)])
+        self._device = np.concatenate([self._devices.encode(devices), np.empty(cap - len(keep), dtype=np.int32)])
+        self._alive = np.concatenate([np.ones(len(keep), dtype=bool), np.empty(cap - len(keep), dtype=bool)])
+        self._n, self._dead = len(keep), 0
+
+    def frame(self):
+        """DataFrame id, name, device_info, reg_date (dd/mm/YYYY, chuỗi lỗi giữ nguyên), duration.
+        Dùng chung tới lần sửa kế tiếp => nơi gọi không được sửa tại chỗ"""
+        if self._frame is not None: return self._frame
+        keep = np.flatnonzero(self._alive[:self._n])
+        ids, days = self._id[keep], self._day[keep]
+        # Định dạng mỗi ngày khác nhau 1 lần; các dòng cùng ngày dùng chung 1 chuỗi
+        uniq, inv = np.unique(days, return_inverse=True)
+        ok = uniq != NO_DATE
+        labels = np.full(len(uniq), "", dtype=object)
+        labels[ok] = pd.to_datetime(uniq[ok].astype(np.int64), unit="D").strftime(DATE_FMT).to_numpy(dtype=object)
+        reg = labels[inv.reshape(-1)] if len(keep) else np.empty(0, dtype=object)
+        if self._bad_dates:
+            bad = np.flatnonzero(days == NO_DATE)
+            reg[bad] = [self._bad_dates.get(cid, "") for cid in ids[bad].tolist()]
+        self._frame = pd.DataFrame({
+            "id": ids, "name": self._names.decode(self._name[keep]), "device_info": self._devices.decode(self._device[keep]),
+            "reg_date": reg, "duration": self._duration[keep].astype(np.int64),
+        }, columns=COLUMNS)
+        self._measure()
+        return self._frame
+
+    def stats(self):
+        return {"rows": len(self), "slots": len(self._id), "deleted": self._dead, "bytes": self.nbytes(),
+                "names": len(self._names.values), "devices": len(self._devices.values)}
+
+
+class GuestRegistry:
+    """Kho của mọi phiên khách trong tiến trình: LRU theo lần dùng gần nhất, bỏ phiên nhàn rỗi quá idle_seconds,
+    tổng RAM vượt total_bytes => bỏ phiên ít dùng nhất (phiên đó lần sau nhận lại dữ liệu mẫu)"""
+
+    def __init__(self, session_bytes=32 << 20, total_bytes=512 << 20, idle_seconds=1800, max_rows=200_000):
+        self.session_bytes = session_bytes
+        self.total_bytes = total_bytes
+        self.idle_seconds = idle_seconds
+        self.max_rows = max_rows
+        self._stores = OrderedDict()   # session id -> [store, lần dùng cuối]
+        self._total = 0                # tổng nbytes() các kho, cập nhật qua GuestStore.on_resize
+        self._lock = threading.Lock()
+        self._evicted_idle = 0
+        self._evicted_memory = 0
+
+    def get(self, session_id, seed=None):
+        """Kho của phiên (chưa có hoặc đã bị bỏ => tạo mới, nạp seed() làm dữ liệu mẫu); đồng thời dọn phiên nhàn rỗi/quá RAM"""
+        now = time.monotonic()
+        with self._lock:
+            item = self._stores.get(session_id)
+            if item is None:
+                store = GuestStore(self.max_rows, self.session_bytes)
+                if seed is not None: store.append(seed(), base_id=1)
+                store.on_resize = lambda delta, sid=session_id, store=store: self._resized(sid, store, delta)
+                item = self._stores[session_id] = [store, now]
+                self._total += store.nbytes()
+            item[1] = now
+            self._stores.move_to_end(session_id)
+            self._evict(now, keep=session_id)
+            return item[0]
+
+    def _resized(self, session_id, store, delta):
+        # Kho đã bị bỏ (hoặc thay bằng kho mới cùng phiên) => không còn tính vào tổng
+        with self._lock:
+            item = self._stores.get(session_id)
+            if item is not None and item[0] is store: self._total += delta
+
+    def _remove(self, session_id):
+        # Gọi khi đang giữ _lock
+        store = self._stores.pop(session_id)[0]
+        store.on_resize = None
+        self._total -= store.nbytes()
+
+    def _evict(self, now, keep):
+        for sid, (store, last) in list(self._stores.items()):
+            if now - last <= self.idle_seconds: break   # OrderedDict xếp theo lần dùng => phần sau đều mới hơn
+            self._remove(sid); self._evicted_idle += 1
+        for sid in list(self._stores):
+            if self._total <= self.total_bytes: break
+            if sid == keep: continue
+            self._remove(sid); self._evicted_memory += 1
+
+    def enforce(self):
+        """Gọi sau khi 1 phiên thêm dữ liệu: kiểm tra lại tổng RAM"""
+        with self._lock: self._evict(time.monotonic(), keep=next(reversed(self._stores), None))
+
+    def drop(self, session_id):
+        with self._lock:
+            if session_id in self._stores: self._remove(session_id)
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            sessions = [{"session": sid[:8], **store.stats(), "idle_s": now - last} for sid, (store, last) in self._stores.items()]
+        return {"sessions": len(sessions), "bytes": self._total, "total_bytes": self.total_bytes,
+                "session_bytes": self.session_bytes, "evicted_idle": self._evicted_idle,
+                "evicted_memory": self._evicted_memory, "per_session": sessions}
+
+
+def compact_frame(df, max_unique_ratio=0.5):
+    """Thu gọn DataFrame khách đọc từ SQL để giữ lâu trong cache: cột chuỗi lặp nhiều -> category,
+    số nguyên -> int32 (id giữ int64). Cùng cột, cùng giá trị; NULL của cột chuỗi thành "".
+    pandas 3 đọc chuỗi từ SQL ra dtype 'str' (không còn object) => kiểm tra cả hai"""
+    if df.empty: return df
+    out = {}
+    for col in df.columns:
+        s = df[col]
+        is_text = pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s)
+        if is_text and s.isna().any():
+            # category / 'str' biến None thành NaN => tab 2 hiện "nan" và lưu lại chữ "nan"
+            s = out[col] = s.fillna("")
+        if is_text and s.nunique(dropna=False) <= max_unique_ratio * len(s):
+            out[col] = s.astype("category")
+        elif col in ("owner_id", "duration") and pd.api.types.is_integer_dtype(s):
+            out[col] = s.astype(np.int32)
+    return df.assign(**out) if out else df
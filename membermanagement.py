@@ -3,11 +3,22 @@ import sqlite3
 import pandas as pd
 from datetime import datetime, timedelta
 import time
+import math
 import io
-import hashlib
-import json
-import ast
+import os
+import uuid
+from functools import partial
 import extra_streamlit_components as stx
+from member_db import ConnectionPool, OwnerCache, CUSTOMER_COLUMNS, bulk_insert_frames, apply_customer_changes, customers_by_ids, migrate, query_customers, count_customers, status_counts, status_counts_from_events, owner_events, app_setting, search_frame, monthly_revenue, last_expiry_scan
+from member_dates import parse_date, to_iso_date, process_data_for_editor, revenue_by_month
+from member_import import ImportFormatError, iter_import_frames
+from member_auth import LatencyStats, PasswordHasher, SessionSigner, PBKDF2_ITERATIONS, SCRYPT_N
+from member_scheduler import ExpiryScheduler, FileNotifier
+from member_export import EXPORT_FORMATS, available_formats, export_filename, export_mime, export_to_file, iter_customer_chunks, iter_frame_chunks, sweep_exports
+from member_profile import Profiler
+from member_store import GuestQuotaError, GuestRegistry, compact_frame
+
+RERUN_START = time.perf_counter()
 
 # --- 1. CẤU HÌNH & CSS ---
 st.set_page_config(page_title="Hệ Thống Quản Lý Tài Khoản", page_icon="🎮", layout="wide")
@@ -67,71 +78,123 @@ st.markdown("""
 # --- 2. HỆ THỐNG DATABASE ---
 DB_FILE = "dulieu_game_v2.db"
 
-def make_hashes(password):
-    return hashlib.sha256(str.encode(password)).hexdigest()
-
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL
-                )''')
-    c.execute('''CREATE TABLE IF NOT EXISTS customers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            owner_id INTEGER, 
-            name TEXT NOT NULL,
-            device_info TEXT,
-            reg_date TEXT,
-            duration INTEGER)''')
-    conn.commit()
-    conn.close()
+@st.cache_resource
+def get_pool():
+    # 1 pool / tiến trình, dùng chung cho mọi phiên Streamlit; schema nâng cấp 1 lần khi tạo pool
+    pool = ConnectionPool(DB_FILE)
+    init_db(pool)
+    return pool
+
+@st.cache_resource
+def get_cache():
+    # Cache kết quả truy vấn theo owner, dùng chung mọi phiên; ghi dữ liệu => invalidate(owner_id).
+    # Giới hạn RAM chỉnh trong app_settings (cache_mb)
+    with get_pool().connection() as conn:
+        return OwnerCache(max_entries=256, ttl=300, max_bytes=int(app_setting(conn, "cache_mb", 256)) << 20)
+
+@st.cache_resource
+def get_scheduler():
+    # Luồng quét hết hạn hằng ngày, 1 luồng / tiến trình; thông báo ghi vào notifications.jsonl
+    scheduler = ExpiryScheduler(get_pool(), FileNotifier())
+    scheduler.start()
+    return scheduler
+
+def init_db(pool):
+    with pool.connection() as conn:
+        migrate(conn)
+
+@st.cache_resource
+def get_profiler():
+    # Đo từng lượt rerun (stage, số câu SQL, dòng đọc, RAM DataFrame) => profile.jsonl; mặc định tắt.
+    # Bật: MEMBER_PROFILE=1 hoặc app_settings.profiling='1'; xem bảng đo ở sidebar khi mở ?admin=1
+    with get_pool().connection() as conn: enabled = app_setting(conn, "profiling", "0") == "1"
+    profiler = Profiler(enabled=enabled or os.environ.get("MEMBER_PROFILE") == "1")
+    if profiler.enabled: get_pool().trace = profiler.trace
+    return profiler
+
+profiler = get_profiler()
+profiler.begin()
 
 # --- 3. XỬ LÝ COOKIE & AUTH (FIX LỖI F5) ---
 # Khởi tạo cookie manager ngay đầu chương trình
 # key="cookie_manager" giúp nó không bị reset liên tục
 cookie_manager = stx.CookieManager(key="cookie_manager")
+SESSION_COOKIE = "game_app_session"
+
+@st.cache_resource
+def get_signer():
+    # Token phiên ký HMAC, kiểm tra trong RAM; khóa ký đọc 1 lần từ app_settings
+    with get_pool().connection() as conn: return SessionSigner(app_setting(conn, "session_secret"))
+
+@st.cache_resource
+def get_metrics():
+    # Độ trễ theo lượt chạy lại (auth, rerun...) để xem p50/p99 ở sidebar
+    return LatencyStats()
+
+def flash(message):
+    """Thay cho st.success + time.sleep + st.rerun: lưu thông báo, chạy lại ngay, lượt sau hiện toast"""
+    st.session_state.flash = message
+    st.rerun()
+
+# Ghi/xóa cookie được hoãn sang lượt chạy kế tiếp: component cookie được render trọn 1 lượt
+# nên trình duyệt kịp nhận, không cần sleep trước st.rerun()
+if "pending_cookie" in st.session_state:
+    action, token = st.session_state.pop("pending_cookie")
+    if action == "set": cookie_manager.set(SESSION_COOKIE, token, expires_at=datetime.now() + timedelta(days=30))
+    else:
+        try: cookie_manager.delete(SESSION_COOKIE)
+        except KeyError: pass
+if "flash" in st.session_state: st.toast(st.session_state.pop("flash"), icon="✅")
+
+@st.cache_resource
+def get_hasher():
+    # Scheme + chi phí băm mật khẩu chỉnh trong app_settings (password_scheme, pbkdf2_iterations, scrypt_n)
+    with get_pool().connection() as conn:
+        return PasswordHasher(app_setting(conn, "password_scheme", "pbkdf2_sha256"),
+                              iterations=app_setting(conn, "pbkdf2_iterations", PBKDF2_ITERATIONS),
+                              n=app_setting(conn, "scrypt_n", SCRYPT_N))
 
 def login_user(username, password):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT * FROM users WHERE username=? AND password=?", (username, make_hashes(password)))
-    data = c.fetchall()
-    conn.close()
-    return data
+    """Kiểm tra mật khẩu trong thread pool băm; đúng mà hash cũ (SHA-256/tham số cũ) => băm lại tại chỗ"""
+    with get_metrics().timer("login"):
+        with get_pool().connection() as conn:
+            rows = conn.execute("SELECT * FROM users WHERE username=?", (username,)).fetchall()
+        hasher = get_hasher()
+        if not rows:
+            hasher.verify_in_pool(password, hasher.dummy_hash())   # cùng chi phí với tài khoản có thật
+            return []
+        if not hasher.verify_in_pool(password, rows[0][2]): return []
+        if hasher.needs_rehash(rows[0][2]):
+            new_hash = hasher.hash_in_pool(password)
+            with get_pool().connection() as conn:
+                conn.execute("UPDATE users SET password=? WHERE id=? AND password=?", (new_hash, rows[0][0], rows[0][2]))
+        return rows
 
 def create_user(username, password):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
     try:
-        c.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, make_hashes(password)))
-        conn.commit(); conn.close(); return True
-    except: conn.close(); return False
+        password_hash = get_hasher().hash_in_pool(password)
+        with get_pool().connection() as conn:
+            conn.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password_hash))
+        return True
+    except sqlite3.IntegrityError: return False
 
 def check_login_status():
     """Logic kiểm tra đăng nhập chặt chẽ hơn"""
-    # 1. Nếu Session đã có user -> OK
-    if 'user_id' in st.session_state and st.session_state['user_id']:
-        return True
-    
-    # 2. Nếu chưa, thử đọc Cookie
-    cookie_user = cookie_manager.get(cookie="game_app_user")
-    
-    if cookie_user:
-        # Xác thực lại với DB để đảm bảo an toàn
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute("SELECT * FROM users WHERE username=?", (cookie_user,))
-        data = c.fetchall()
-        conn.close()
-        
-        if data:
-            st.session_state.user_id = data[0][0]
-            st.session_state.username = cookie_user
+    with get_metrics().timer("auth"), profiler.stage("auth"):
+        # 1. Nếu Session đã có user -> OK
+        if 'user_id' in st.session_state and st.session_state['user_id']:
+            return True
+
+        # 2. Vừa đăng xuất => bỏ qua cookie: lượt chạy ngay sau đó component cookie vẫn trả về token cũ
+        if st.session_state.get("logged_out"): return False
+
+        # 3. Nếu chưa, thử đọc Cookie: token ký HMAC, kiểm tra trong RAM, không đọc SQLite
+        user = get_signer().verify(cookie_manager.get(cookie=SESSION_COOKIE))
+        if user:
+            st.session_state.user_id, st.session_state.username = user
             return True
-            
-    return False
+
+        return False
 
 def get_current_user_id():
     if 'user_id' in st.session_state:
@@ -142,140 +205,276 @@ def get_current_user_id():
 def get_all_customers():
     user_id = get_current_user_id()
     if user_id:
-        conn = sqlite3.connect(DB_FILE)
-        df = pd.read_sql_query("SELECT * FROM customers WHERE owner_id=?", conn, params=(user_id,))
-        conn.close()
-        return df
+        def load():
+            with profiler.stage("all_customers"), get_pool().connection() as conn:
+                df = pd.read_sql_query(f"SELECT {CUSTOMER_COLUMNS} FROM customers WHERE owner_id=?", conn, params=(user_id,))
+            profiler.add_rows(len(df))
+            # Giữ trong cache dùng chung nhiều phiên => thu gọn (category/int32) trước khi cất
+            return compact_frame(df)
+        return get_cache().get(user_id, "all", load)
     else:
-        if 'guest_data' not in st.session_state:
-            st.session_state.guest_data = pd.DataFrame([
-                {"id": 1, "name": "Khách Mẫu", "device_info": "Dữ liệu mẫu", "reg_date": datetime.now().strftime("%d/%m/%Y"), "duration": 1}
-            ])
-        return st.session_state.guest_data
+        return get_guest_store().frame()
+
+@st.cache_resource
+def get_guest_stores():
+    # Dữ liệu chế độ khách của mọi phiên, dạng cột gọn RAM; giới hạn chỉnh trong app_settings
+    # (guest_session_mb, guest_total_mb, guest_idle_minutes, guest_max_rows)
+    with get_pool().connection() as conn:
+        return GuestRegistry(session_bytes=int(app_setting(conn, "guest_session_mb", 32)) << 20,
+                             total_bytes=int(app_setting(conn, "guest_total_mb", 512)) << 20,
+                             idle_seconds=int(app_setting(conn, "guest_idle_minutes", 30)) * 60,
+                             max_rows=int(app_setting(conn, "guest_max_rows", 200_000)))
+
+def _guest_sample():
+    return pd.DataFrame([{"name": "Khách Mẫu", "device_info": "Dữ liệu mẫu", "reg_date": datetime.now().strftime("%d/%m/%Y"), "duration": 1}])
+
+def get_guest_store():
+    """Kho của phiên khách hiện tại (phiên nhàn rỗi lâu hoặc bị bỏ vì quá RAM => nhận lại dữ liệu mẫu)"""
+    if "guest_session" not in st.session_state: st.session_state.guest_session = uuid.uuid4().hex
+    return get_guest_stores().get(st.session_state.guest_session, _guest_sample)
+
+# Chip lọc nhanh ở tab 1 (khớp với icon trạng thái của process_data_for_editor)
+STATUS_CHIPS = {"all": "Tất cả", "expired": "🔴 Đã hết", "expiring": "🟡 Sắp hết (≤3 ngày)", "active": "🟢 Còn hạn", "error": "⚪ Lỗi"}
+STATUS_ICONS = {"🔴": "expired", "🟡": "expiring", "🟢": "active", "⚪": "error"}
+PAGE_SIZES = [25, 50, 100, 200, 500]
+
+def _guest_buckets(df):
+    return process_data_for_editor(df)['Trạng Thái'].str[0].map(STATUS_ICONS)
+
+def get_status_counts():
+    user_id = get_current_user_id()
+    if user_id:
+        def load():
+            # Bộ quét hôm nay đã chạy => đọc trạng thái tính sẵn từ expiry_events, chưa thì đếm qua index
+            with profiler.stage("status_counts"), get_pool().connection() as conn:
+                if last_expiry_scan(conn) == datetime.now().date(): return status_counts_from_events(conn, user_id)
+                return status_counts(conn, user_id)
+        # Nhóm trạng thái đổi theo ngày => ngày hôm nay nằm trong khóa cache
+        counts = dict(get_cache().get(user_id, ("counts", datetime.now().date()), load))
+    else:
+        df = get_all_customers()
+        with profiler.stage("status_counts"): counts = _guest_buckets(df).value_counts().to_dict() if not df.empty else {}
+        counts = {b: int(counts.get(b, 0)) for b in STATUS_CHIPS if b != "all"}
+    counts["all"] = sum(counts.values())
+    return counts
+
+def editor_page_key(bucket, search, page, page_size):
+    # Khóa cache của 1 trang tab 1; trạng thái đổi theo ngày => có ngày hôm nay
+    return ("page", None if bucket == "all" else bucket, search, page, page_size, datetime.now().date())
+
+def get_expiry_events():
+    """Sự kiện sắp hết/vừa hết hạn của owner từ hàng đợi do bộ quét nền ghi (cache tới lần ghi kế tiếp)"""
+    user_id = get_current_user_id()
+    def load():
+        with get_pool().connection() as conn: events = owner_events(conn, user_id)
+        profiler.add_rows(len(events))
+        return events
+    return get_cache().get(user_id, ("events", datetime.now().date()), load)
+
+def get_editor_page(bucket, search, page, page_size):
+    """1 trang khách đã qua process_data_for_editor + tổng số dòng khớp bộ lọc.
+    Đăng nhập: lọc, tìm (FTS5, xếp theo độ khớp), đếm và cắt trang ngay trong SQL, không tải cả bảng;
+    kết quả được cache theo owner cho tới lần ghi kế tiếp"""
+    bucket = None if bucket == "all" else bucket
+    offset = (page - 1) * page_size
+    user_id = get_current_user_id()
+    if user_id:
+        def load():
+            with profiler.stage("editor_page_sql"), get_pool().connection() as conn:
+                total = count_customers(conn, user_id, bucket, search)
+                df = query_customers(conn, user_id, bucket, search, limit=page_size, offset=offset)
+            profiler.add_rows(len(df))
+            with profiler.stage("process_data_for_editor"): return process_data_for_editor(df), total
+        return get_cache().get(user_id, editor_page_key(bucket, search, page, page_size), load)
+    df = get_all_customers()
+    if bucket and not df.empty: df = df[(_guest_buckets(df) == bucket).to_numpy()]
+    if search: df = search_frame(df, search)
+    with profiler.stage("process_data_for_editor"):
+        return process_data_for_editor(df.iloc[offset:offset + page_size].reset_index(drop=True)), len(df)
+
+def get_revenue_rollup():
+    """Doanh thu theo tháng (ym, reg_months, active_subs). Đăng nhập: đọc bảng revenue_monthly do trigger duy trì"""
+    user_id = get_current_user_id()
+    if user_id:
+        def load():
+            with profiler.stage("revenue"), get_pool().connection() as conn: rollup = monthly_revenue(conn, user_id)
+            profiler.add_rows(len(rollup))
+            return rollup
+        return get_cache().get(user_id, "revenue", load)
+    with profiler.stage("revenue"): return revenue_by_month(get_all_customers())
 
 def add_customer(name, device, date, duration):
     user_id = get_current_user_id()
     if user_id:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute("INSERT INTO customers (owner_id, name, device_info, reg_date, duration) VALUES (?, ?, ?, ?, ?)", 
-                  (user_id, name, device, date, duration))
-        conn.commit(); conn.close()
+        with get_pool().connection() as conn:
+            conn.execute("INSERT INTO customers (owner_id, name, device_info, reg_date, duration) VALUES (?, ?, ?, ?, ?)", 
+                         (user_id, name, device, to_iso_date(date), duration))
+        get_cache().invalidate(user_id)
     else:
-        new_row = {"id": int(time.time()), "name": name, "device_info": device, "reg_date": date, "duration": duration}
-        st.session_state.guest_data = pd.concat([st.session_state.guest_data, pd.DataFrame([new_row])], ignore_index=True)
+        get_guest_store().append(pd.DataFrame([{"name": name, "device_info": device, "reg_date": date, "duration": duration}]))
+        get_guest_stores().enforce()
+
+def import_customers(text, size=None, position=None):
+    """Nhập theo luồng từ văn bản (tệp tải lên / văn bản dán): đọc từng lô, ghi từng lô trong 1 transaction,
+    có thanh tiến trình, trả về thống kê. position() = số byte đã đọc (để tính % khi biết size)"""
+    frames = iter_import_frames(text)
+    user_id = get_current_user_id()
+    with profiler.stage("import"): return _import_frames(frames, user_id, size, position)
+
+def _import_frames(frames, user_id, size, position):
+    if user_id:
+        bar = st.progress(0.0, text="Đang nhập dữ liệu...")
+        def on_progress(done):
+            pct = min(position() / size, 1.0) if size and position else 0.0
+            bar.progress(pct, text=f"Đang nhập {done:,} dòng... ({pct:.0%})")
+        try: return bulk_insert_frames(get_pool(), user_id, frames, progress=on_progress)
+        finally: bar.empty(); get_cache().invalidate(user_id)
+    start = time.perf_counter()
+    parts = [f[['name', 'device_info', 'reg_date', 'duration']] for f in frames]
+    df_new = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=['name', 'device_info', 'reg_date', 'duration'])
+    # Cấp id liên tiếp, không trùng; vượt giới hạn phiên => GuestQuotaError, không thêm dòng nào
+    get_guest_store().append(df_new)
+    get_guest_stores().enforce()
+    elapsed = time.perf_counter() - start
+    return {"rows": len(df_new), "seconds": elapsed, "rows_per_sec": len(df_new) / elapsed if elapsed > 0 else float(len(df_new))}
+
+def show_import_result(res):
+    if res['rows']:
+        flash(f"Đã nhập {res['rows']:,} khách! ({res['rows_per_sec']:,.0f} dòng/giây)")
+    else: st.error("Không đọc được dữ liệu.")
+
+def prepare_export(fmt, compress):
+    """Tạo tệp xuất (chỉ khi bấm nút), đọc từ cursor SQL theo lô; tệp cũ của phiên bị xóa,
+    tệp bỏ lại của các phiên đã đóng được dọn sau EXPORT_MAX_AGE"""
+    old = st.session_state.pop("export_file", None)
+    if old and os.path.exists(old["path"]): os.remove(old["path"])
+    sweep_exports()
+    user_id = get_current_user_id()
+    with profiler.stage("export"):
+        if user_id:
+            with get_pool().connection() as conn:
+                path, rows, size = export_to_file(iter_customer_chunks(conn, user_id), fmt, compress)
+        else:
+            path, rows, size = export_to_file(iter_frame_chunks(get_all_customers()), fmt, compress)
+    profiler.add_rows(rows)
+    if not rows: os.remove(path); return None
+    st.session_state.export_file = {"path": path, "rows": rows, "size": size, "fmt": fmt, "compress": compress}
+    return st.session_state.export_file
+
+def read_export(path):
+    # Chạy ở luồng của Streamlit khi người dùng bấm tải (data=callable của st.download_button)
+    with open(path, "rb") as fh: return fh.read()
 
 def update_customer_db(id, name, device, date, duration):
     user_id = get_current_user_id()
     if user_id:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute("UPDATE customers SET name=?, device_info=?, reg_date=?, duration=? WHERE id=? AND owner_id=?", 
-                  (name, device, date, duration, id, user_id))
-        conn.commit(); conn.close()
-    else:
-        df = st.session_state.guest_data
-        idx = df.index[df['id'] == id].tolist()
-        if idx:
-            df.at[idx[0], 'name'] = name; df.at[idx[0], 'device_info'] = device; df.at[idx[0], 'reg_date'] = date; df.at[idx[0], 'duration'] = duration
-            st.session_state.guest_data = df
+        with get_pool().connection() as conn:
+            conn.execute("UPDATE customers SET name=?, device_info=?, reg_date=?, duration=? WHERE id=? AND owner_id=?", 
+                         (name, device, to_iso_date(date), duration, id, user_id))
+        get_cache().invalidate(user_id)
+    else: get_guest_store().update([(name, device, date, duration, id)])
 
 def delete_customer_db(id):
     user_id = get_current_user_id()
     if user_id:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute("DELETE FROM customers WHERE id=? AND owner_id=?", (id, user_id))
-        conn.commit(); conn.close()
-    else:
-        df = st.session_state.guest_data
-        st.session_state.guest_data = df[df['id'] != id].reset_index(drop=True)
+        with get_pool().connection() as conn:
+            conn.execute("DELETE FROM customers WHERE id=? AND owner_id=?", (id, user_id))
+        get_cache().invalidate(user_id)
+    else: get_guest_store().delete([id])
 
 # --- CALLBACK EDITOR ---
-def save_editor_changes():
-    changes = st.session_state.editor_changes
-    if 'current_view_df' not in st.session_state: return
-    df_view = st.session_state.current_view_df
-
+def _editor_value(edits, record, col, default=None):
+    return edits[col] if col in edits else (record.get(col, default) if record is not None else default)
+
+def validate_editor_row(label, name, device, date_val, duration, fallback_date):
+    """Kiểm tra 1 dòng của editor. Trả về ((name, device, reg_date ISO, duration), None) hoặc (None, lỗi)"""
+    name = "" if name is None or pd.isna(name) else str(name).strip()
+    if not name: return None, f"{label}: thiếu tên khách hàng"
+    device = "" if device is None or pd.isna(device) else str(device)
+    if date_val and parse_date(date_val) is None: return None, f"{label}: ngày đăng ký không hợp lệ ({date_val})"
+    reg = to_iso_date(str(date_val)) if date_val else fallback_date
+    try: duration = int(duration)
+    except (TypeError, ValueError): return None, f"{label}: số tháng không hợp lệ ({duration})"
+    if duration < 1: return None, f"{label}: số tháng phải ≥ 1"
+    return (name, device, reg, duration), None
+
+def build_editor_batch(changes, df_view):
+    """Diff của data_editor -> (updates, deletes, inserts, errors) theo định dạng apply_customer_changes.
+    row_idx của editor là vị trí trong trang đang xem (current_view_df)"""
+    updates, deletes, inserts, errors = [], [], [], []
+    today = datetime.now().strftime("%Y-%m-%d")
     for row_idx, edits in changes['edited_rows'].items():
-        try:
-            record_id = df_view.iloc[row_idx]['id']
-            record = df_view.iloc[row_idx].to_dict()
-            new_name = edits.get("Tên Khách Hàng", record['name'])
-            new_device = edits.get("Thông tin khách hàng", record['device_info'])
-            new_dur = edits.get("Gói (tháng)", record['duration'])
-            new_date_val = edits.get("Ngày ĐK", record['reg_date_obj'])
-            new_date_str = new_date_val.strftime("%d/%m/%Y") if isinstance(new_date_val, datetime) else str(new_date_val)
-            update_customer_db(record_id, new_name, new_device, new_date_str, int(new_dur))
-        except: pass
-
+        row_idx = int(row_idx)
+        if row_idx >= len(df_view): errors.append(f"Dòng {row_idx + 1}: không còn trong trang"); continue
+        record = df_view.iloc[row_idx].to_dict()
+        row, err = validate_editor_row(f"Dòng {row_idx + 1}", _editor_value(edits, record, "Tên Khách Hàng"),
+                                       _editor_value(edits, record, "Thông tin khách hàng"), edits.get("Ngày ĐK"),
+                                       _editor_value(edits, record, "Gói (tháng)"), record['reg_date'])
+        if err: errors.append(err)
+        else: updates.append(row + (int(record['id']),))
     for row_idx in changes['deleted_rows']:
-        try: record_id = df_view.iloc[row_idx]['id']; delete_customer_db(record_id)
-        except: pass
-
-    for new_row in changes['added_rows']:
-        try:
-            n_name = new_row.get("Tên Khách Hàng", "Khách Mới")
-            n_dev = new_row.get("Thông tin khách hàng", "")
-            n_dur = new_row.get("Gói (tháng)", 1)
-            n_date_str = datetime.now().strftime("%d/%m/%Y") 
-            if "Ngày ĐK" in new_row:
-                 try: n_date_str = datetime.strptime(str(new_row["Ngày ĐK"]), "%Y-%m-%d").strftime("%d/%m/%Y")
-                 except: pass
-            add_customer(n_name, n_dev, n_date_str, int(n_dur))
-        except: pass
+        if row_idx >= len(df_view): errors.append(f"Dòng {row_idx + 1}: không còn trong trang"); continue
+        deletes.append(int(df_view.iloc[row_idx]['id']))
+    for n, new_row in enumerate(changes['added_rows'], 1):
+        row, err = validate_editor_row(f"Dòng mới {n}", new_row.get("Tên Khách Hàng", "Khách Mới"),
+                                       new_row.get("Thông tin khách hàng", ""), new_row.get("Ngày ĐK"),
+                                       new_row.get("Gói (tháng)", 1), today)
+        if err: errors.append(err)
+        else: inserts.append(row)
+    return updates, deletes, inserts, errors
+
+def _apply_guest_changes(updates, deletes, inserts):
+    # Thêm trước: chỉ bước này có thể vượt giới hạn phiên (GuestQuotaError) => khi đó chưa sửa/xóa gì
+    store = get_guest_store()
+    store.append(pd.DataFrame(inserts, columns=['name', 'device_info', 'reg_date', 'duration']))
+    res = {"updated": store.update(updates), "deleted": store.delete(deletes), "inserted": len(inserts)}
+    get_guest_stores().enforce()
+    return res
+
+def _view_key_columns(view_key):
+    """Cột quyết định 1 dòng có thuộc trang (nhóm trạng thái, khớp tìm kiếm) và nằm ở đâu (xem query_customers)"""
+    _, bucket, search = view_key[:3]
+    cols = ["Hết Hạn"] if bucket else ["Tên Khách Hàng"]
+    if search: cols += ["Tên Khách Hàng", "Thông tin khách hàng"]
+    return list(dict.fromkeys(cols))
+
+def _refresh_view_rows(user_id, ids):
+    """Chỉ sửa (không thêm/xóa) => đọc lại đúng các dòng đó và vá vào trang đang xem thay vì truy vấn lại cả trang.
+    Dòng sửa đổi nhóm/không còn khớp tìm kiếm/đổi khóa sắp xếp => bỏ qua, trang truy vấn lại ở lượt sau"""
+    view_key = st.session_state.get("current_view_key")
+    if view_key is None: return
+    with get_pool().connection() as conn: fresh = process_data_for_editor(customers_by_ids(conn, user_id, ids))
+    view = st.session_state.current_view_df.set_index('id', drop=False)
+    fresh = fresh.set_index('id', drop=False)
+    rows = fresh.index.intersection(view.index)
+    keys = _view_key_columns(view_key)
+    if len(rows) < len(set(ids)) or (view.loc[rows, keys].to_numpy() != fresh.loc[rows, keys].to_numpy()).any(): return
+    view.loc[rows, fresh.columns] = fresh.loc[rows, fresh.columns]
+    view = view.reset_index(drop=True)
+    st.session_state.current_view_df = view
+    get_cache().put(user_id, view_key, (view, st.session_state.current_view_total))
+
+def save_editor_changes(editor_key):
+    """Áp cả lô thay đổi của editor trong 1 transaction. Có dòng không hợp lệ => không áp gì, báo lỗi từng dòng"""
+    changes = st.session_state[editor_key]
+    if 'current_view_df' not in st.session_state: return
+    updates, deletes, inserts, errors = build_editor_batch(changes, st.session_state.current_view_df)
+    st.session_state.editor_errors = errors
+    if errors or not (updates or deletes or inserts): return
+    user_id = get_current_user_id()
+    if user_id:
+        try: res = apply_customer_changes(get_pool(), user_id, updates, deletes, inserts)
+        except sqlite3.Error as e: st.session_state.editor_errors = [f"Lưu thất bại, đã hoàn tác cả lô: {e}"]; return
+        get_cache().invalidate(user_id)
+        if updates and not (deletes or inserts): _refresh_view_rows(user_id, [u[-1] for u in updates])
+    else:
+        try: res = _apply_guest_changes(updates, deletes, inserts)
+        except GuestQuotaError as e: st.session_state.editor_errors = [str(e)]; return
+    st.session_state.editor_result = res
+    # Diff của editor cộng dồn theo key => đổi key để lần sửa sau không áp lại lô vừa lưu
+    st.session_state.editor_version = st.session_state.get("editor_version", 0) + 1
 
 # --- UTILS KHÁC ---
-def parse_date(date_str):
-    for fmt in ["%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%m/%d/%Y", "%d/%m/%y"]:
-        try: return datetime.strptime(str(date_str).strip(), fmt)
-        except: continue
-    return None
-
-def calculate_expiry(start_date, months):
-    if not start_date: return None
-    try:
-        import calendar
-        year = start_date.year; month = start_date.month + int(months)
-        while month > 12: month -= 12; year += 1
-        day = min(start_date.day, calendar.monthrange(year, month)[1])
-        return datetime(year, month, day)
-    except: return None
-
-def process_data_for_editor(df):
-    if df.empty: return df
-    df['reg_date_obj'] = df['reg_date'].apply(lambda x: parse_date(x))
-    df['duration'] = pd.to_numeric(df['duration'], errors='coerce').fillna(1).astype(int)
-    today = datetime.now()
-    def get_status_expiry(row):
-        exp = calculate_expiry(row['reg_date_obj'], row['duration'])
-        if not exp: return "Lỗi", "⚪ Lỗi"
-        days = (exp - today).days
-        exp_str = exp.strftime("%d/%m/%Y")
-        if days < 0: return exp_str, f"🔴 ĐÃ HẾT ({abs(days)}d)"
-        if days <= 3: return exp_str, f"🟡 Sắp hết ({days}d)"
-        return exp_str, f"🟢 Còn {days} ngày"
-
-    df[['Hết Hạn', 'Trạng Thái']] = df.apply(lambda x: pd.Series(get_status_expiry(x)), axis=1)
-    return df.rename(columns={"name": "Tên Khách Hàng", "device_info": "Thông tin khách hàng", "reg_date_obj": "Ngày ĐK", "duration": "Gói (tháng)"})
-
-def smart_import(df_raw):
-    df_raw.columns = [str(c).lower().strip() for c in df_raw.columns]
-    col_map = {'name': '', 'device': '', 'date': '', 'duration': ''}
-    for col in df_raw.columns:
-        if any(x in col for x in ['ten', 'name', 'khach']): col_map['name'] = col
-        elif any(x in col for x in ['thiet', 'device', 'thông tin']): col_map['device'] = col
-        elif any(x in col for x in ['ngay', 'date']): col_map['date'] = col
-        elif any(x in col for x in ['thang', 'duration']): col_map['duration'] = col
-    
-    df_clean = pd.DataFrame()
-    df_clean['name'] = df_raw[col_map['name']] if col_map['name'] else "Khách Nhập"
-    df_clean['device_info'] = df_raw[col_map['device']] if col_map['device'] else ""
-    if col_map['date']: df_clean['reg_date'] = df_raw[col_map['date']].fillna(datetime.now().strftime("%d/%m/%Y"))
-    else: df_clean['reg_date'] = datetime.now().strftime("%d/%m/%Y")
-    df_clean['duration'] = pd.to_numeric(df_raw[col_map['duration']], errors='coerce').fillna(1).astype(int) if col_map['duration'] else 1
-    return df_clean
-
 @st.dialog("➕ Thêm Khách Hàng Nhanh")
 def show_add_modal():
     with st.form("quick_add"):
@@ -285,42 +484,28 @@ def show_add_modal():
         dur = st.number_input("Thời hạn (tháng)", min_value=1, value=1)
         if st.form_submit_button("Lưu ngay", type="primary"):
             if n:
-                add_customer(n, d, dt.strftime("%d/%m/%Y"), int(dur))
-                st.success("Đã thêm!"); time.sleep(0.5); st.rerun()
+                try: add_customer(n, d, dt.strftime("%d/%m/%Y"), int(dur))
+                except GuestQuotaError as e: st.error(str(e)); return
+                flash("Đã thêm!")
             else: st.error("Vui lòng nhập tên")
 
 @st.dialog("📊 Báo Cáo Doanh Thu")
-def show_monthly_revenue(df, price):
-    if df.empty: st.warning("Chưa có dữ liệu."); return
-    df = df.copy()
-    df['duration'] = pd.to_numeric(df['duration'], errors='coerce').fillna(0)
-    def get_ym(d): 
-        dt = parse_date(d); return dt.strftime("%Y-%m") if dt else "N/A"
-    df['YYYY_MM'] = df['reg_date'].apply(get_ym)
-    df = df[df['YYYY_MM'] != "N/A"]
-    df['Rev'] = df['duration'] * price
-    stats = df.groupby('YYYY_MM')['Rev'].sum().reset_index()
-    stats['Tháng'] = stats['YYYY_MM']
+def show_monthly_revenue(rollup, price):
+    if rollup.empty: st.warning("Chưa có dữ liệu."); return
+    basis = st.radio("Cách tính:", ["Theo tháng đăng ký", "Chia đều theo tháng sử dụng"], horizontal=True)
+    col = "reg_months" if basis == "Theo tháng đăng ký" else "active_subs"
+    stats = pd.DataFrame({"Tháng": rollup["ym"], "Rev": rollup[col] * price})
+    stats = stats[stats["Rev"] != 0]
     st.metric("TỔNG DOANH THU", "{:,.0f} VNĐ".format(stats['Rev'].sum()))
     st.bar_chart(stats, x="Tháng", y="Rev", color="#2ecc71")
     st.dataframe(stats, hide_index=True)
 
-def parse_import_text(text_content):
-    clean = text_content.strip()
-    try:
-        if clean.startswith("[") or clean.startswith("{"):
-            try: return pd.DataFrame(json.loads(clean))
-            except: return pd.DataFrame(ast.literal_eval(clean))
-        df = pd.read_csv(io.StringIO(clean), sep=None, engine='python', header=None)
-        if df.iloc[0].apply(lambda x: isinstance(x, str)).all():
-            return pd.read_csv(io.StringIO(clean), sep=None, engine='python')
-        return df
-    except: return pd.DataFrame()
-
 # --- 5. GIAO DIỆN CHÍNH ---
-init_db()
+with profiler.stage("init_db"):
+    get_pool()
+    get_scheduler()
 
-with st.sidebar:
+with st.sidebar, profiler.stage("sidebar"):
     st.image("https://i.ibb.co/3ymHhQVd/logo.png", width=250)
     
     # KIỂM TRA ĐĂNG NHẬP (QUAN TRỌNG)
@@ -329,9 +514,11 @@ with st.sidebar:
     if is_logged_in:
         st.success(f"Xin chào, {st.session_state.username}!")
         if st.button("🚪 Đăng xuất", type="primary", use_container_width=True):
+            get_signer().revoke(cookie_manager.get(cookie=SESSION_COOKIE))
             st.session_state.username = None
             st.session_state.user_id = None
-            cookie_manager.delete("game_app_user") # Xóa cookie
+            st.session_state.logged_out = True
+            st.session_state.pending_cookie = ("delete", None) # Xóa cookie ở lượt sau
             st.rerun()
     else:
         # Cập nhật thông báo theo yêu cầu
@@ -344,16 +531,58 @@ with st.sidebar:
                     res = login_user(u, p)
                     if res: 
                         st.session_state.user_id = res[0][0]; st.session_state.username = u
-                        # Set cookie 30 ngày
-                        cookie_manager.set("game_app_user", u, expires_at=datetime.now() + timedelta(days=30))
-                        time.sleep(0.5)
-                        st.rerun()
+                        st.session_state.pop("logged_out", None)
+                        get_guest_stores().drop(st.session_state.pop("guest_session", None))   # trả RAM của dữ liệu khách
+                        # Set cookie 30 ngày (token ký), ghi ở lượt chạy kế tiếp
+                        st.session_state.pending_cookie = ("set", get_signer().issue(res[0][0], u))
+                        flash(f"Xin chào, {u}!")
                     else: st.error("Sai tài khoản/mật khẩu")
             with t2:
                 nu = st.text_input("Tài khoản mới", key="nu"); np = st.text_input("Mật khẩu mới", type="password", key="np")
                 if st.button("Đăng ký"):
                     if create_user(nu, np): st.success("Thành công! Hãy đăng nhập.")
                     else: st.error("Tên đã tồn tại")
+    if get_current_user_id():
+        events = get_expiry_events()
+        with st.expander(f"🔔 Thông báo hết hạn ({len(events)})"):
+            if events.empty: st.caption("Không có khách sắp hết hoặc vừa hết hạn.")
+            for ev in events.itertuples():
+                icon = "🔴 Đã hết" if ev.kind == "expired" else "🟡 Sắp hết"
+                st.caption(f"{icon} {parse_date(ev.expiry_date).strftime('%d/%m/%Y')} — **{ev.name}** {ev.device_info or ''}")
+    with st.expander("📈 Kết nối CSDL"):
+        ps = get_pool().stats()
+        st.caption(f"Đang mở: {ps['open']}/{ps['max_size']} (bận {ps['in_use']}, rảnh {ps['idle']})")
+        st.caption(f"Chờ kết nối: TB {ps['avg_wait_ms']:.2f} ms | Max {ps['max_wait_ms']:.2f} ms | {ps['waited']}/{ps['acquired']} lần phải chờ")
+        cs = get_cache().stats()
+        ss = get_scheduler().stats()
+        st.caption(f"Quét hết hạn: {ss['last_run']:%d/%m %H:%M} | Mới {ss['last_result']['new']} | Gửi {ss['last_result']['sent']}"
+                   if ss['last_run'] else f"Quét hết hạn: chưa chạy{' (lỗi: ' + str(ss['last_error']) + ')' if ss['last_error'] else ''}")
+        ms = get_metrics()
+        for name in ms.names():
+            m = ms.summary(name)
+            st.caption(f"⏱️ {name}: p50 {m['p50_ms']:.1f} ms | p99 {m['p99_ms']:.1f} ms | max {m['max_ms']:.1f} ms ({m['count']} lượt)")
+        st.caption(f"Cache: {cs['entries']}/{cs['max_entries']} mục, {cs['bytes'] / 1048576:,.1f}/{cs['max_bytes'] / 1048576:,.0f} MB ({cs['owners']} tài khoản) | Trúng {cs['hits']}/{cs['hits'] + cs['misses']} ({cs['hit_rate']:.0%}) | Xóa {cs['invalidations']} lần")
+        gs = get_guest_stores().stats()
+        st.caption(f"Phiên khách: {gs['sessions']} | RAM {gs['bytes'] / 1048576:,.1f}/{gs['total_bytes'] / 1048576:,.0f} MB "
+                   f"(≤ {gs['session_bytes'] / 1048576:,.0f} MB/phiên) | Đã bỏ: {gs['evicted_idle']} nhàn rỗi, {gs['evicted_memory']} quá RAM")
+        if not get_current_user_id():
+            mine = get_guest_store().stats()
+            st.caption(f"Phiên này: {mine['rows']:,} khách, {mine['bytes'] / 1024:,.1f} KB")
+        if st.query_params.get("admin") == "1" and gs['per_session']:
+            st.dataframe(pd.DataFrame(gs['per_session'])[["session", "rows", "bytes", "idle_s"]], hide_index=True)
+    if profiler.enabled and st.query_params.get("admin") == "1":
+        # Bảng đo ẩn: chỉ hiện khi bật profiling và mở trang với ?admin=1
+        with st.expander("🧪 Profiling"):
+            recent = profiler.recent()
+            if recent:
+                last = recent[-1]
+                st.caption(f"Lượt trước: {last['total_ms']:.1f} ms | {last['sql']} câu SQL | {last['rows']:,} dòng đọc")
+                st.dataframe(pd.DataFrame({"stage": list(last["stages"]), "ms": list(last["stages"].values())}), hide_index=True)
+                if last["frames"]: st.caption(" | ".join(f"{k}: {v / 1048576:,.2f} MB" for k, v in last["frames"].items()))
+            summary = {name: profiler.stats.summary(name) for name in profiler.stats.names()}
+            if summary:
+                st.dataframe(pd.DataFrame(summary).T[["count", "p50_ms", "p95_ms", "p99_ms", "max_ms"]].round(2))
+            st.caption(f"Log: {os.path.abspath(profiler.log_path)} (bản {profiler.release})")
     st.divider()
     st.link_button("Donate Ủng Hộ ❤️", "https://tsufu.gitbook.io/donate/", type="primary")
 
@@ -366,7 +595,7 @@ with tab1:
     c1, c2, c3 = st.columns([1, 2, 1])
     with c1: price = st.number_input("Giá/tháng (VNĐ):", 50000, step=10000)
     with c3: 
-        if st.button("💎 Xem Doanh Thu"): show_monthly_revenue(get_all_customers(), price)
+        if st.button("💎 Xem Doanh Thu"): show_monthly_revenue(get_revenue_rollup(), price)
     
     st.divider()
     col_btn, col_search = st.columns([1, 3])
@@ -375,12 +604,31 @@ with tab1:
     with col_search:
         search = st.text_input("🔍 Tìm kiếm:", placeholder="Nhập tên hoặc thông tin...")
     
-    df = get_all_customers()
-    if search:
-        df = df[df['name'].str.contains(search, case=False) | df['device_info'].str.contains(search, case=False)]
-    
-    df_editor = process_data_for_editor(df)
+    counts = get_status_counts()
+    bucket = st.pills("Lọc nhanh:", list(STATUS_CHIPS), default="all", key="status_chip",
+                      format_func=lambda b: f"{STATUS_CHIPS[b]} ({counts[b]:,})") or "all"
+
+    # Phân trang phía server: chỉ trang đang xem được truy vấn và xử lý
+    col_size, col_page, col_total = st.columns([1, 1, 2])
+    with col_size: page_size = st.selectbox("Số dòng/trang", PAGE_SIZES, index=1, key="page_size")
+    filter_sig = (bucket, search, page_size)
+    if st.session_state.get("page_filter") != filter_sig:
+        st.session_state.page_filter = filter_sig; st.session_state.page_no = 1
+        st.session_state.pop("editor_errors", None)
+    with profiler.stage("editor_page"):
+        df_editor, total = get_editor_page(bucket, search, st.session_state.page_no, page_size)
+        pages = max(1, math.ceil(total / page_size))
+        if st.session_state.page_no > pages:
+            st.session_state.page_no = pages
+            df_editor, total = get_editor_page(bucket, search, pages, page_size)
+    profiler.frame("editor_page", df_editor)
+    with col_page: page = st.number_input(f"Trang (/{pages:,})", min_value=1, max_value=pages, step=1, key="page_no")
+    with col_total: st.caption(f"Tổng: **{total:,}** khách | Đang xem {min((page - 1) * page_size + 1, total):,}–{min(page * page_size, total):,}")
+
     st.session_state.current_view_df = df_editor
+    st.session_state.current_view_key, st.session_state.current_view_total = editor_page_key(bucket, search, page, page_size), total
+    # Key riêng cho mỗi trang/bộ lọc (và mỗi lô đã lưu) để thay đổi không bị áp nhầm sang trang khác hay áp lại 2 lần
+    editor_key = f"editor_changes_{bucket}_{page}_{page_size}_{search}_{st.session_state.get('editor_version', 0)}"
 
     if not df_editor.empty:
         # CẬP NHẬT HƯỚNG DẪN NGẮN GỌN THEO YÊU CẦU
@@ -388,7 +636,7 @@ with tab1:
         🔍 **Icon Tìm kiếm** | 📥 **Icon Tải về** | 🗑️ **Xóa:** Tích ô vuông đầu dòng cần xóa ➜ Bấm icon **Thùng rác (Delete)** ở góc phải bảng.
         """)
         
-        edited_df = st.data_editor(
+        with profiler.stage("data_editor"): edited_df = st.data_editor(
             df_editor,
             column_config={
                 "id": None, "name": None, "device_info": None, "reg_date": None, "duration": None, "reg_date_obj": None,
@@ -399,16 +647,21 @@ with tab1:
                 "Trạng Thái": st.column_config.TextColumn("Trạng Thái", disabled=True), 
             },
             column_order=["Tên Khách Hàng", "Thông tin khách hàng", "Ngày ĐK", "Gói (tháng)", "Hết Hạn", "Trạng Thái"],
-            use_container_width=True, num_rows="dynamic", key="editor_changes", on_change=save_editor_changes
+            use_container_width=True, num_rows="dynamic", key=editor_key, on_change=save_editor_changes, args=(editor_key,)
         )
     else: st.info("Chưa có dữ liệu.")
+    if st.session_state.get("editor_errors"):
+        st.error("Chưa lưu thay đổi nào, vui lòng sửa các dòng sau:\n\n" + "\n".join(f"- {e}" for e in st.session_state.editor_errors))
+    res = st.session_state.pop("editor_result", None)
+    if res: st.toast(f"Đã lưu: sửa {res['updated']:,}, xóa {res['deleted']:,}, thêm {res['inserted']:,} dòng")
 
 # TAB 2: QUẢN LÝ
 with tab2:
     st.subheader("🛠️ Chỉnh sửa hoặc Xóa Khách Hàng")
     df_edit = get_all_customers()
+    profiler.frame("customers", df_edit)
     if not df_edit.empty:
-        opts = df_edit.apply(lambda x: f"{x['id']} - {x['name']}", axis=1)
+        with profiler.stage("tab2_options"): opts = df_edit.apply(lambda x: f"{x['id']} - {x['name']}", axis=1)
         choice = st.selectbox("👉 Chọn khách hàng cần thao tác:", opts)
         if choice:
             cid = int(choice.split(" - ")[0]); crec = df_edit[df_edit['id'] == cid].iloc[0]
@@ -422,14 +675,14 @@ with tab2:
                     edu = st.number_input("Tháng", value=int(crec['duration']), min_value=1)
                     if st.form_submit_button("Lưu Thay Đổi"):
                         update_customer_db(cid, en, ed, edp.strftime("%d/%m/%Y"), edu)
-                        st.success("Đã cập nhật!"); time.sleep(0.5); st.rerun()
+                        flash("Đã cập nhật!")
             with col_r:
                 st.write("🗑️ **Xóa dữ liệu:**")
                 st.warning("Hành động này không thể hoàn tác.")
                 # Nút xóa to rõ, không bị lỗi font
                 if st.button("❌ Xóa Khách Này", type="primary", use_container_width=True):
                     delete_customer_db(cid)
-                    st.success("Đã xóa thành công!"); time.sleep(0.5); st.rerun()
+                    flash("Đã xóa thành công!")
     else: st.info("Chưa có dữ liệu.")
 
 # TAB 3: NHẬP/XUẤT
@@ -441,35 +694,38 @@ with tab3:
         with t_file:
             st.caption("Hỗ trợ: .csv, .json, .txt hoặc các định dạng văn bản khác.")
             uploaded_file = st.file_uploader("Chọn tệp tin:", type=['csv', 'json', 'txt'])
-            if uploaded_file:
-                try:
-                    string_data = uploaded_file.read().decode("utf-8")
-                    if st.button("🚀 Xử lý tệp tin"):
-                        df_up = parse_import_text(string_data)
-                        if not df_up.empty:
-                            df_c = smart_import(df_up); cnt = 0
-                            for _, r in df_c.iterrows(): add_customer(r['name'], r['device_info'], r['reg_date'], r['duration']); cnt += 1
-                            st.success(f"Đã nhập {cnt} khách!"); time.sleep(1); st.rerun()
-                        else: st.error("Không đọc được dữ liệu.")
-                except Exception as e: st.error(f"Lỗi: {e}")
+            if uploaded_file and st.button("🚀 Xử lý tệp tin"):
+                # Đọc thẳng từ tệp theo từng lô, không decode/copy cả tệp thành 1 chuỗi
+                uploaded_file.seek(0)
+                text = io.TextIOWrapper(uploaded_file, encoding="utf-8-sig", newline="")
+                try: show_import_result(import_customers(text, uploaded_file.size, uploaded_file.tell))
+                except (sqlite3.Error, ImportFormatError, GuestQuotaError, pd.errors.ParserError, UnicodeDecodeError) as e:
+                    st.error(f"Nhập thất bại, đã hoàn tác toàn bộ: {e}")
+                finally: text.detach()
         with t_paste:
             with st.form("paste_form"):
                 txt = st.text_area("Dán dữ liệu vào đây", height=200, placeholder='[{"name": "A", ...}]')
                 if st.form_submit_button("🚀 Xử lý"):
                     if txt:
-                        df_up = parse_import_text(txt)
-                        if not df_up.empty:
-                            df_c = smart_import(df_up); cnt = 0
-                            for _, r in df_c.iterrows(): add_customer(r['name'], r['device_info'], r['reg_date'], r['duration']); cnt += 1
-                            st.success(f"Đã nhập {cnt} khách!"); time.sleep(1); st.rerun()
-                        else: st.error("Dữ liệu lỗi.")
+                        try: show_import_result(import_customers(io.StringIO(txt.strip())))
+                        except (sqlite3.Error, ImportFormatError, GuestQuotaError, pd.errors.ParserError) as e:
+                            st.error(f"Nhập thất bại, đã hoàn tác toàn bộ: {e}")
     with exp:
         st.subheader("📤 Xuất dữ liệu (Export)")
-        dfe = get_all_customers()
-        if not dfe.empty:
-            st.download_button("Tải .csv (Excel)", dfe.to_csv(index=False).encode('utf-8'), "data.csv", "text/csv")
-            st.download_button("Tải .json", dfe.to_json(orient="records", force_ascii=False).encode('utf-8'), "data.json", "application/json")
-            st.download_button("Tải .txt", dfe.to_csv(index=False, sep="\t").encode('utf-8'), "data.txt", "text/plain")
-        else: st.warning("Trống.")
-
-st.markdown("""<div class="footer">Dev by Tsufu / Phú Trần Trung Lê | <a href="https://tsufu.gitbook.io/donate/" target="_blank">Donate Coffee ☕</a></div>""", unsafe_allow_html=True)
\ No newline at end of file
+        col_fmt, col_gz = st.columns([2, 1])
+        with col_fmt: exp_fmt = st.selectbox("Định dạng:", available_formats(), format_func=lambda f: EXPORT_FORMATS[f][0], key="export_fmt")
+        with col_gz: exp_gz = st.checkbox("Nén gzip", key="export_gzip")
+        if st.button("⚙️ Tạo tệp xuất"):
+            if not prepare_export(exp_fmt, exp_gz): st.warning("Trống.")
+        ef = st.session_state.get("export_file")
+        if ef and ef["fmt"] == exp_fmt and ef["compress"] == exp_gz and os.path.exists(ef["path"]):
+            name = export_filename(ef["fmt"], ef["compress"])
+            os.utime(ef["path"])   # nút còn hiện => sweep_exports chưa được dọn tệp này
+            # Truyền hàm thay vì tệp: Streamlit chỉ đọc tệp khi bấm tải, không nạp lại vào RAM mỗi lượt rerun
+            st.download_button(f"📥 Tải {name} ({ef['rows']:,} dòng, {ef['size'] / 1048576:,.1f} MB)",
+                               partial(read_export, ef["path"]), name, export_mime(ef["fmt"], ef["compress"]))
+
+st.markdown("""<div class="footer">Dev by Tsufu / Phú Trần Trung Lê | <a href="https://tsufu.gitbook.io/donate/" target="_blank">Donate Coffee ☕</a></div>""", unsafe_allow_html=True)
+
+get_metrics().record("rerun", time.perf_counter() - RERUN_START)
+profiler.end(logged_in=bool(get_current_user_id()))